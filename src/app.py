@@ -1,14 +1,20 @@
-from PyQt5.QtCore import QDir, QEvent
+from PyQt5.QtCore import QDir, QEvent, QFileSystemWatcher, pyqtSignal
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import *
-from playsound import playsound
-from pydub.playback import play
 
 from plot_widgets import *
 from recognition import WordRecognition
 from testcase import *
 import os.path
+import threading
 from mic import LiveFFTWidget
+from playback import PlaybackEngine
+from reference_watcher import WatchedReference
+import ingest
+from distance_cache import DistanceCache
+from catalog import CorpusCatalog, default_directories
+from sessions import RecognitionHub
+import snapshot
 from PyQt5.QtCore import Qt
 from scipy.io.wavfile import write
 
@@ -64,8 +70,7 @@ class DirSection(QWidget):
                     if len(a):
                         a = a[0]
                         if os.path.exists(file + "\\Wav"):
-                            test_case = Testcase(file)
-                            self.parent().parent().wr.setReference(test_case, a['speaker type'])
+                            self.parent().parent().watchReference(file, a[2])
 
                 print(file)
             return True
@@ -131,7 +136,7 @@ class FileSection(QWidget):
                         sample['speaker age'] = int(a[3])
                         sample['word pair'] = int(a[4])
                         sample['word'] = int(a[5]) if a[5] != '' else 1
-                        t, f = librosa.load(file, sr=None)
+                        t = ingest.load(file)
                         sample['wav'] = t
                         self.parent().parent().exeFile(sample)
                 elif action.text() == 'Play':
@@ -141,6 +146,106 @@ class FileSection(QWidget):
         return super().eventFilter(source, event)
 
 
+class CatalogSection(QWidget):
+    """
+    A QWidget section that searches the corpus catalog by speaker type, age and word pair.
+    Users can run or play the matching recordings without walking the directories.
+    """
+    # Emitted from the indexing thread, so Qt queues them to the GUI thread
+    updated = pyqtSignal(tuple)
+    failed = pyqtSignal(str)
+    indexed = pyqtSignal()
+
+    def __init__(self, catalog, parent=None):
+        super(CatalogSection, self).__init__(parent=parent)
+        self.__catalog = catalog
+        self.__rows = []
+        self.setLayout(QVBoxLayout())
+
+        filters = QWidget(self)
+        filters.setLayout(QHBoxLayout())
+        self.__type = QComboBox(self)
+        self.__type.addItems(['Any', 'M', 'F', 'C'])
+        self.__minAge = QSpinBox(self)
+        self.__minAge.setRange(0, 99)
+        self.__maxAge = QSpinBox(self)
+        self.__maxAge.setRange(0, 99)
+        self.__maxAge.setValue(99)
+        self.__pair = QSpinBox(self)
+        self.__pair.setRange(0, 24)
+        self.__pair.setSpecialValueText('Any pair')
+        self.__search = QPushButton("Search", clicked=self.search)
+        for widget in (self.__type, self.__minAge, self.__maxAge, self.__pair, self.__search):
+            filters.layout().addWidget(widget)
+
+        self.__listView = QListWidget()
+        self.layout().addWidget(filters)
+        self.layout().addWidget(self.__listView)
+        self.__listView.itemDoubleClicked.connect(self.connect)
+        self.__listView.installEventFilter(self)
+        self.indexed.connect(self.__indexed)
+
+    def index(self, directories):
+        """
+        Indexes the directories on a background thread, keeping the window responsive.
+
+        Searching is disabled until indexing ends, whether it succeeded or failed.
+        """
+        self.__search.setEnabled(False)
+        self.__search.setText("Indexing...")
+
+        def run():
+            try:
+                self.updated.emit(self.__catalog.update(directories))
+            except Exception as e:
+                self.failed.emit(str(e))
+            finally:
+                self.indexed.emit()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def __indexed(self):
+        self.__search.setText("Search")
+        self.__search.setEnabled(True)
+
+    def search(self):
+        """
+        Lists the recordings matching the filters.
+        """
+        speaker_type = self.__type.currentText()
+        self.__rows = self.__catalog.query(speaker_type=None if speaker_type == 'Any' else speaker_type,
+                                           min_age=self.__minAge.value(), max_age=self.__maxAge.value(),
+                                           word_pair=self.__pair.value() or None)
+        self.__listView.clear()
+        self.__listView.addItems([f"{row['name']}  ({row['directory']})" for row in self.__rows])
+
+    def connect(self, item):
+        """
+        Runs the double clicked recording.
+        """
+        self.parent().parent().exeFile(self.__catalog.sample(self.__rows[self.__listView.row(item)]))
+
+    def eventFilter(self, source, event):
+        """
+        Handles context menu events for the result list.
+        """
+        if event.type() == QEvent.ContextMenu and source is self.__listView:
+            menu = QMenu()
+            menu.addAction('Run')
+            menu.addAction('Play')
+
+            action = menu.exec_(event.globalPos())
+            item = self.__listView.currentItem()
+            if action and item is not None:
+                row = self.__rows[self.__listView.row(item)]
+                if action.text() == 'Run':
+                    self.parent().parent().exeFile(self.__catalog.sample(row))
+                elif action.text() == 'Play':
+                    self.parent().parent().playSound(row['path'])
+            return True
+        return super().eventFilter(source, event)
+
+
 class MainApp(QMainWindow):
     """
     Main application class for the SSA Sound Recognition System.
@@ -154,6 +259,9 @@ class MainApp(QMainWindow):
         "هزم", "حزم", "الحمدلله"
     ]
 
+    # Emitted from the recognition hub's threads, so Qt queues them to the GUI thread
+    recognized = pyqtSignal(str, object, object)
+
     def __init__(self):
         super(MainApp, self).__init__(None)
         l = len(MainApp.WordsList)
@@ -164,16 +272,30 @@ class MainApp(QMainWindow):
 
         self.__currentRef = 0
         self.__makeWordRecognition()
+        # Recordings are recognized off the GUI thread, through the same hub as capture sessions
+        self.__hub = RecognitionHub(self.wr)
+        self.recognized.connect(self.__recognized)
+        self.__watchedReferences = {}
+        self.__referenceWatcher = QFileSystemWatcher(self)
+        self.__referenceWatcher.directoryChanged.connect(self.__referenceChanged)
+        self.__referenceWatcher.fileChanged.connect(self.__referenceFileChanged)
         self.__dirSide = DirSection(self)
         self.__fileSide = FileSection(self)
+        # Indexed once, then only files changed since the last launch are re-hashed
+        self.__catalog = CorpusCatalog('catalog.db')
+        self.__catalogSide = CatalogSection(self.__catalog, self)
         self.__tabView = QTabWidget(self)
         self.__makeDockWidget("Dires", self.__dirSide, Qt.LeftDockWidgetArea)
         self.__makeDockWidget("Files", self.__fileSide, Qt.LeftDockWidgetArea)
+        self.__makeDockWidget("Catalog", self.__catalogSide, Qt.LeftDockWidgetArea)
         self.__log = QTextEdit(self)
         self.__log.setReadOnly(True)
         self.__log.append("\n Welcome to SSA Sound Recognition System\n")
         self.__log.append(" all rights reserved © 2022 . Sohila . Sabry . Awwad\n")
         self.__makeDockWidget("Logging", self.__log, Qt.BottomDockWidgetArea)
+        self.__catalogSide.updated.connect(self.__catalogUpdated)
+        self.__catalogSide.failed.connect(self.__catalogFailed)
+        self.__catalogSide.index(default_directories())
         self.setCentralWidget(self.__tabView)
         self.__makeFigures()
         self.__makeRecorder()
@@ -187,8 +309,47 @@ class MainApp(QMainWindow):
         """
         Initializes the word recognition system.
         """
-        self.wr = WordRecognition()
-        self.__hop_length = 512
+        WordRecognition.DistanceCache = DistanceCache(path='distances.db')
+        # Restored from the last launch unless the references or the features changed
+        self.wr = snapshot.load_or_build('recognizer.snapshot')
+
+    def __catalogUpdated(self, counts):
+        added, changed, removed = counts
+        self.__log.append(f'\n Catalog updated: {added} added, {changed} changed, {removed} removed')
+
+    def __catalogFailed(self, error):
+        self.__log.append(f'\n Catalog update failed: {error}')
+
+    def watchReference(self, path, type):
+        """
+        Uses a directory as the reference of a speaker type and keeps it in sync with the disk.
+        """
+        reference = WatchedReference(path)
+        self.wr.setReference(reference, type)
+        self.__watchedReferences[path + "\\Wav"] = reference
+        self.__referenceWatcher.addPath(path + "\\Wav")
+        self.__referenceWatcher.addPaths(reference.get_files())
+        self.__log.append(f'\n {path} is now the reference of type {type}')
+
+    def __referenceChanged(self, path):
+        """
+        Reloads the changed files of a watched reference directory.
+        """
+        reference = self.__watchedReferences.get(path)
+        if reference is not None:
+            added, changed, removed = reference.refresh()
+            # Files rewritten in place only notify their own watch
+            if added:
+                self.__referenceWatcher.addPaths(added)
+            self.__log.append(f'\n Reference updated: {len(added)} added, {len(changed)} changed, {len(removed)} removed')
+
+    def __referenceFileChanged(self, file):
+        """
+        Reloads the reference containing a file that was rewritten in place.
+        """
+        for path, reference in self.__watchedReferences.items():
+            if file in reference.get_files():
+                self.__referenceChanged(path)
 
     def updatePath(self, path):
         """
@@ -202,7 +363,8 @@ class MainApp(QMainWindow):
         """
         if os.path.exists(path + "\\Wav"):
             test_case = Testcase(path)
-            g, t = self.wr.decide_gender(test_case)
+            result = self.wr.recognize(test_case)
+            g, t = result['gender'], result['reference']['wav']
             types = {"C": "Child", "F": "Female", "M": "Male"}
             self.__log.append(
                 f'\n The selected path has gender {types[g]} and the right gender is {types[test_case.get_main_sample()["speaker type"]]}')
@@ -230,10 +392,10 @@ class MainApp(QMainWindow):
         """
         Updates the plots for the recognition system.
         """
-        self.__spectorgram.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate, self.__hop_length)
-        self.__dtwGraph.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate, self.__hop_length)
-        self.__relationGraph.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate, self.__hop_length)
-        self.__featureGraph.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate, self.__hop_length)
+        self.__spectorgram.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate, WordRecognition.Features)
+        self.__dtwGraph.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate, WordRecognition.Features)
+        self.__relationGraph.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate, WordRecognition.Features)
+        self.__featureGraph.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate, WordRecognition.Features)
         self.__waveGraph.makePlot(self.__currentTimeWaveFrom, self.__currentRef, WordRecognition.SampleRate)
 
     def __makeRecorder(self):
@@ -255,6 +417,10 @@ class MainApp(QMainWindow):
         self.__stop.setIcon(QIcon('icons/stop.png'))
         self.__run = QPushButton("Play", clicked=self.__playRecord)
         self.__run.setIcon(QIcon('icons/play.png'))
+        self.__compare = QPushButton("Compare", clicked=self.__playComparison)
+        self.__compare.setIcon(QIcon('icons/play.png'))
+        self.__silence = QPushButton("Silence", clicked=self.__stopPlayback)
+        self.__silence.setIcon(QIcon('icons/stop.png'))
         self.__check = QPushButton("Check G", clicked=self.__check)
         self.__check.setIcon(QIcon('icons/check.png'))
         self.__checkP = QPushButton("Check P", clicked=self.__checkP)
@@ -268,6 +434,8 @@ class MainApp(QMainWindow):
         self.__controlButtons.layout().addWidget(self.__pause)
         self.__controlButtons.layout().addWidget(self.__stop)
         self.__controlButtons.layout().addWidget(self.__run)
+        self.__controlButtons.layout().addWidget(self.__compare)
+        self.__controlButtons.layout().addWidget(self.__silence)
         self.__controlButtons.layout().addWidget(self.__check)
         self.__controlButtons.layout().addWidget(self.__checkP)
         self.__controlButtons.layout().addWidget(self.__checkList)
@@ -275,6 +443,8 @@ class MainApp(QMainWindow):
         # Recorder Graphs
         self.__recoder = LiveFFTWidget()
         self.__mainRecorder.layout().addWidget(self.__recoder)
+        # Playback shares the PyAudio instance of the recorder
+        self.__player = PlaybackEngine(self.__recoder.mic.p, self.__recoder.mic.rate)
 
     def __indexChanged(self, ind):
         """
@@ -287,14 +457,32 @@ class MainApp(QMainWindow):
         """
         Checks the recorded sound and updates the logs with the recognition result.
         """
-        s, t = librosa.load('temp.wav', sr=None)
-        r = self.wr.decide_speech_pair(s, self.__currentGender, self.__currentListIndex)
-        self.__currentTimeWaveFrom = s
-        self.__currentRef = self.wr.getReference(self.__currentGender, self.__currentListIndex)['wav']
+        self.__submit('pair', ingest.load('temp.wav'), self.__currentGender, self.__currentListIndex)
+
+    def __submit(self, kind, signal, gender=None, index=None):
+        """
+        Queues a recording to the recognition hub; the result arrives through ``recognized``.
+        """
+        future = self.__hub.submit('main', 'recognize', signal, gender, index)
+        future.add_done_callback(lambda f: self.recognized.emit(kind, signal, f))
+
+    def __recognized(self, kind, signal, future):
+        """
+        Shows the result of a recognized recording and plots it against its reference.
+        """
+        if future.exception() is not None:
+            self.__log.append(f'\n {future.exception()}')
+            return
+        result = future.result()
+        self.__currentTimeWaveFrom = signal
+        self.__currentRef = result['reference']['wav']
         self.__updatePlots()
-        if r == 1:
+        if kind == 'gender':
+            types = {"C": "Child", "F": "Female", "M": "Male"}
+            self.__log.append(f'\n Your Gender is {types[result["gender"]]}')
+        elif result['decision'] == 1:
             self.__log.append("\n Right")
-        elif r == 0:
+        elif result['decision'] == 0:
             self.__log.append("\n Wrong")
         else:
             self.__log.append("\n Others")
@@ -366,25 +554,30 @@ class MainApp(QMainWindow):
         Checks the recorded sound for gender recognition and updates the logs.
         """
         if os.path.exists('temp.wav'):
-            t, f = librosa.load('temp.wav')
-            g, ref = self.wr.decide_gender(t)
-            types = {"C": "Child", "F": "Female", "M": "Male"}
-            self.__log.append(f'\n Your Gender is {types[g]}')
-            self.__currentTimeWaveFrom = t
-            self.__currentRef = ref
-            self.__updatePlots()
+            self.__submit('gender', ingest.load('temp.wav'))
         else:
             self.__log.append("Can't find the recorded Sound")
 
     def playSound(self, path: str):
         """
-        Plays the sound file at the given path.
+        Plays the sound file at the given path without blocking the interface.
+        """
+        self.__player.play(path)
+
+    def __playComparison(self):
+        """
+        Plays the current reference and test sounds one after the other.
         """
-        if path.find('.wav') != -1:
-            audio = AudioSegment.from_wav(path)
+        if isinstance(self.__currentRef, np.ndarray) and isinstance(self.__currentTimeWaveFrom, np.ndarray):
+            self.__player.interleave(self.__currentRef, self.__currentTimeWaveFrom)
         else:
-            audio = AudioSegment.from_mp3(path)
-        play(audio)
+            self.__log.append("\n Run a check first to compare sounds")
+
+    def __stopPlayback(self):
+        """
+        Stops the sound playing and everything queued.
+        """
+        self.__player.stop()
 
 
 if __name__ == '__main__':
@@ -392,3 +585,4 @@ if __name__ == '__main__':
     main = MainApp()
     main.show()
     app.exec_()
+    WordRecognition.DistanceCache.close()
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def _align_chunk(pairs):
+    """
+    Aligns a chunk of pairs together, one anti-diagonal of every cost matrix per step.
+
+    The features are padded to the longest test and reference of the chunk. Cells on the
+    anti-diagonal ``i + j = s`` only depend on the two previous anti-diagonals, so all of them, for
+    every pair, are computed by one set of array operations; cells outside a pair's own matrix
+    are masked to infinity.
+
+    Returns:
+        numpy.ndarray: The DTW distance of every pair.
+    """
+    K = len(pairs)
+    d = pairs[0][0].shape[0]
+    n = np.array([a.shape[1] for a, _ in pairs])
+    m = np.array([b.shape[1] for _, b in pairs])
+    N, M = int(n.max()), int(m.max())
+    A = np.zeros((K, N, d))
+    B = np.zeros((K, M, d))
+    for k, (a, b) in enumerate(pairs):
+        A[k, :n[k]] = a.T
+        B[k, :m[k]] = b.T
+    rows_valid = np.arange(N)[None, :] < n[:, None]
+    columns_valid = np.arange(M)[None, :] < m[:, None]
+    ends = n + m - 2
+    distances = np.full(K, np.inf)
+    pairs_index = np.arange(K)
+
+    # Diagonals are indexed by row + 1, index 0 standing for the row before the first
+    before = np.full((K, N + 1), np.inf)
+    previous = np.full((K, N + 1), np.inf)
+    for s in range(N + M - 1):
+        i = np.arange(max(0, s - M + 1), min(N - 1, s) + 1)
+        j = s - i
+        cost = np.sqrt(((A[:, i, :] - B[:, j, :]) ** 2).sum(axis=2))
+        current = np.full((K, N + 1), np.inf)
+        if s == 0:
+            current[:, 1] = cost[:, 0]
+        else:
+            # Diagonal (i-1, j-1), up (i-1, j) and left (i, j-1) predecessors
+            best = np.minimum(np.minimum(before[:, i], previous[:, i]), previous[:, i + 1])
+            current[:, i + 1] = np.where(rows_valid[:, i] & columns_valid[:, j], cost + best, np.inf)
+
+        finished = ends == s
+        if finished.any():
+            distances[finished] = current[pairs_index[finished], n[finished]]
+        before, previous = previous, current
+
+    return distances
+
+
+def batch_dtw(pairs, chunk=256, threads=1):
+    """
+    Computes the exact DTW distance of many independent (test, reference) pairs at once.
+
+    Pairs are sorted by size and cut into chunks of similar lengths, so little padding is
+    aligned, and every chunk advances all its dynamic programs together along anti-diagonals.
+    NumPy releases the GIL inside its array operations, so with ``threads`` above one several
+    chunks are aligned at the same time.
+
+    The distances are those of full DTW with unit steps and euclidean frame distances, which
+    ``fastdtw`` approximates from above.
+
+    Args:
+        pairs (list): The (test, reference) feature matrices, each (coefficients, frames).
+        chunk (int): The largest number of pairs aligned together.
+        threads (int): The number of threads aligning chunks.
+
+    Returns:
+        numpy.ndarray: The DTW distance of every pair, in the order given.
+    """
+    distances = np.empty(len(pairs))
+    if not pairs:
+        return distances
+    order = sorted(range(len(pairs)), key=lambda k: (pairs[k][0].shape[1], pairs[k][1].shape[1]))
+    chunks = [order[start:start + chunk] for start in range(0, len(order), chunk)]
+
+    def run(ids):
+        distances[ids] = _align_chunk([pairs[k] for k in ids])
+
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(run, chunks))
+    else:
+        for ids in chunks:
+            run(ids)
+    return distances
@@ -0,0 +1,167 @@
+import time
+import numpy as np
+
+
+def coarse_features(features, factor=4, dims=8):
+    """
+    Reduces a feature matrix for the cheap first pass of the cascade.
+
+    Frames are mean pooled in blocks of ``factor`` and only the first ``dims`` coefficients are
+    kept, which cuts the DTW cost by roughly ``factor ** 2 * (coefficients / dims)``.
+
+    Args:
+        features (numpy.ndarray): The features with shape (coefficients, frames).
+        factor (int): The number of frames pooled together.
+        dims (int): The number of leading coefficients kept.
+
+    Returns:
+        numpy.ndarray: The reduced features with shape (dims, ceil(frames / factor)).
+    """
+    reduced = features[:dims]
+    frames = reduced.shape[1]
+    padding = (-frames) % factor
+    if padding:
+        reduced = np.pad(reduced, ((0, 0), (0, padding)), mode='edge')
+    return reduced.reshape(reduced.shape[0], -1, factor).mean(axis=2)
+
+
+class CascadeStats:
+    """
+    Accumulates the cost and recall of cascaded searches.
+
+    Attributes:
+        queries (int): The number of cascaded searches.
+        candidates (int): The number of candidates scored by the coarse pass.
+        full_comparisons (int): The number of full resolution alignments run.
+        hits (int): The searches whose expected candidate survived the shortlist.
+        known (int): The searches whose expected candidate was known.
+        coarse_time (float): The seconds spent in the coarse pass.
+        full_time (float): The seconds spent in full resolution alignments.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.candidates = 0
+        self.full_comparisons = 0
+        self.hits = 0
+        self.known = 0
+        self.coarse_time = 0.0
+        self.full_time = 0.0
+
+    def add(self, candidates, shortlist, expected, coarse_time, full_time):
+        self.queries += 1
+        self.candidates += candidates
+        self.full_comparisons += len(shortlist)
+        if expected is not None:
+            self.known += 1
+            self.hits += expected in shortlist
+        self.coarse_time += coarse_time
+        self.full_time += full_time
+
+    def report(self):
+        """
+        Returns:
+            dict: The shortlist recall, the fraction of full alignments avoided and the timings.
+        """
+        return {
+            'queries': self.queries,
+            'recall': self.hits / self.known if self.known else None,
+            'avoided': 1 - self.full_comparisons / self.candidates if self.candidates else 0.0,
+            'coarse time': self.coarse_time,
+            'full time': self.full_time,
+        }
+
+
+def shortlist(test, references, k, factor=4, dims=8):
+    """
+    Ranks references by their DTW distance on coarse features and keeps the best ``k``.
+
+    Args:
+        test (numpy.ndarray): The test features.
+        references (list): For every candidate, its list of reference feature matrices.
+        k (int): The shortlist size.
+        factor (int): The number of frames pooled together.
+        dims (int): The number of leading coefficients kept.
+
+    Returns:
+        list: The indices of the shortlisted candidates, best first.
+    """
+    # Imported here since recognition itself uses the cascade
+    from recognition import WordRecognition
+
+    coarse_test = coarse_features(test, factor, dims)
+    costs = [min(WordRecognition.compare_features(coarse_test, coarse_features(r, factor, dims)) for r in refs)
+             for refs in references]
+    return list(np.argsort(costs)[:k])
+
+
+def evaluate_cascade(wr, tests, sizes=(1, 2, 3, 5, 8), factor=4, dims=8):
+    """
+    Measures shortlist recall against the exhaustive search and the time each size would take.
+
+    Every test sample is scored exhaustively once at full resolution and once on coarse features,
+    so the recall and cost of every shortlist size follow without rerunning the search.
+
+    Args:
+        wr (WordRecognition): The recognizer holding the references.
+        tests (list): The ``Testcase`` objects to evaluate.
+        sizes (tuple): The shortlist sizes to report.
+        factor (int): The number of frames pooled together.
+        dims (int): The number of leading coefficients kept.
+
+    Returns:
+        list: One dict per size with its recall, the fraction of full alignments avoided and the
+        estimated seconds per search relative to the exhaustive search.
+    """
+    from recognition import WordRecognition
+
+    hits = {k: 0 for k in sizes}
+    full_cost = {k: 0.0 for k in sizes}
+    coarse_time = 0.0
+    exhaustive_time = 0.0
+    searches = 0
+    candidates = 0
+    for test in tests:
+        g = test.get_main_sample()['speaker type']
+        ref_cases = wr.getReferenceCases(g)
+        references = [WordRecognition.reference_features(ref_cases[i]) for i in range(0, len(ref_cases), 2)]
+        for sample in test.get_cases():
+            features = WordRecognition.extract_features(sample['wav'])
+
+            start = time.perf_counter()
+            ranking = shortlist(features, references, len(references), factor, dims)
+            coarse_time += time.perf_counter() - start
+
+            costs = []
+            seconds = []
+            for refs in references:
+                start = time.perf_counter()
+                costs.append(min(WordRecognition.compare_features(features, r) for r in refs))
+                seconds.append(time.perf_counter() - start)
+            exhaustive_time += sum(seconds)
+
+            best = int(np.argmin(costs))
+            for k in sizes:
+                hits[k] += best in ranking[:k]
+                full_cost[k] += sum(seconds[i] for i in ranking[:k])
+            searches += 1
+            candidates += len(references)
+
+    return [{
+        'shortlist': k,
+        'recall': hits[k] / searches if searches else None,
+        'avoided': 1 - min(k * searches, candidates) / candidates if candidates else 0.0,
+        'relative time': (coarse_time + full_cost[k]) / exhaustive_time if exhaustive_time else None,
+    } for k in sizes]
+
+
+if __name__ == '__main__':
+    from glob import glob
+    from recognition import WordRecognition
+    from testcase import Testcase
+
+    wr = WordRecognition()
+    tests = [Testcase(file + '\\Segments') for file in sorted(glob('Testcases/*'))]
+    for row in evaluate_cascade(wr, tests):
+        print(f"shortlist {row['shortlist']:2d}  recall {row['recall']:.3f}  "
+              f"avoided {row['avoided']:.1%}  relative time {row['relative time']:.3f}")
@@ -0,0 +1,272 @@
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from testcase import Testcase
+
+Schema = '''
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    group_number INTEGER,
+    student_number INTEGER,
+    speaker_type TEXT,
+    speaker_age INTEGER,
+    word_pair INTEGER,
+    word INTEGER,
+    position INTEGER,
+    mtime_ns INTEGER,
+    size INTEGER,
+    hash TEXT,
+    features TEXT,
+    features_key TEXT
+);
+CREATE INDEX IF NOT EXISTS recordings_speaker ON recordings (speaker_type, speaker_age);
+CREATE INDEX IF NOT EXISTS recordings_word ON recordings (word_pair, word);
+CREATE INDEX IF NOT EXISTS recordings_directory ON recordings (directory);
+CREATE INDEX IF NOT EXISTS recordings_hash ON recordings (hash);
+'''
+
+Columns = ['path', 'directory', 'name', 'group_number', 'student_number', 'speaker_type', 'speaker_age',
+           'word_pair', 'word', 'position', 'mtime_ns', 'size', 'hash', 'features', 'features_key']
+
+# The position of the main recording, after the 23 word pairs, as in Testcase.get_main_sample
+MainPosition = 46
+
+
+def default_directories():
+    """
+    Returns:
+        list: The test case directories the batch tools use.
+    """
+    return sorted([file + '\\Segments' for file in glob.glob('Testcases/*')] + glob.glob('Segments/*'))
+
+
+class CorpusCatalog:
+    """
+    An SQLite index of every recording of the corpus.
+
+    Each recording is indexed once with the metadata parsed from its name, the SHA-1 of its
+    content, and a pointer to its stored features with the ``FeatureConfig.key`` they were
+    extracted with. Updates only re-hash files whose modification time or size changed, and
+    queries on speaker type, age and word pair use indexes instead of walking directories.
+    """
+
+    def __init__(self, path='catalog.db'):
+        """
+        Args:
+            path (str): The database file, or ':memory:'.
+        """
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__packs = {}
+        # The GUI queries from the Qt thread while batch tools may update from workers
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.row_factory = sqlite3.Row
+        self.__db.executescript(Schema)
+
+    @staticmethod
+    def file_hash(path):
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    @staticmethod
+    def parse(path):
+        """
+        Parses the metadata of a recording from its ``G..S..`` name.
+
+        Returns:
+            dict: The metadata columns, or None when the name does not follow the pattern.
+        """
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        try:
+            info = Testcase.extract_information(name)
+        except IndexError:
+            return None
+        group = re.findall(r'G(\d+)S', name)
+        # The main recording has no W digit, which extract_information reads as word 1 of its pair
+        main = not re.search(r'[WM]P\d+W\d', name)
+        return {
+            'name': name,
+            'group_number': int(group[0]) if group else 0,
+            'student_number': info['student_number'],
+            'speaker_type': info['speaker type'],
+            'speaker_age': info['speaker age'],
+            'word_pair': info['word pair'],
+            'word': info['word'],
+            'position': MainPosition if main else (info['word pair'] - 1) * 2 + info['word'] - 1,
+        }
+
+    def update(self, directories):
+        """
+        Indexes the wav files of test case directories, only re-hashing changed files.
+
+        Files removed from the given directories are dropped from the catalog. Recordings whose
+        content changed lose their feature pointer.
+
+        Args:
+            directories (list): The ``Testcase`` directories.
+
+        Returns:
+            tuple: The numbers of added, changed and removed recordings.
+        """
+        added = changed = removed = 0
+        with self.__lock, self.__db:
+            for directory in directories:
+                known = {row['path']: row for row in
+                         self.__db.execute('SELECT path, mtime_ns, size, position FROM recordings '
+                                           'WHERE directory = ?', (directory,))}
+                files = glob.glob(directory + '\\Wav\\*.wav')
+                for file in files:
+                    st = os.stat(file)
+                    row = known.get(file)
+                    info = CorpusCatalog.parse(file)
+                    if row is not None and row['mtime_ns'] == st.st_mtime_ns and row['size'] == st.st_size:
+                        # Catalogs indexed before the main recording had its own position
+                        if info is not None and row['position'] != info['position']:
+                            self.__db.execute('UPDATE recordings SET position = ? WHERE path = ?',
+                                              (info['position'], file))
+                        continue
+                    if info is None:
+                        continue
+                    info.update(path=file, directory=directory, mtime_ns=st.st_mtime_ns, size=st.st_size,
+                                hash=CorpusCatalog.file_hash(file), features=None, features_key=None)
+                    self.__db.execute(f'INSERT OR REPLACE INTO recordings ({", ".join(Columns)}) '
+                                      f'VALUES ({", ".join("?" * len(Columns))})', [info[c] for c in Columns])
+                    if row is None:
+                        added += 1
+                    else:
+                        changed += 1
+
+                gone = set(known) - set(files)
+                self.__db.executemany('DELETE FROM recordings WHERE path = ?', [(f,) for f in gone])
+                removed += len(gone)
+        return added, changed, removed
+
+    def index_pack(self, path):
+        """
+        Points the recordings packed in a ``CorpusPack`` at their stored features.
+
+        Returns:
+            int: The number of recordings pointed at the pack.
+        """
+        from corpus_pack import CorpusPack
+
+        pack = CorpusPack(path)
+        key = pack.features_key()
+        with self.__lock, self.__db:
+            cursor = self.__db.executemany(
+                'UPDATE recordings SET features = ?, features_key = ? WHERE path = ?',
+                [(f'{path}#{i}', key, entry['path']) for i, entry in enumerate(pack.samples())])
+            return cursor.rowcount
+
+    def set_features(self, path, pointer, key):
+        """
+        Records where the features of a recording are stored.
+
+        Args:
+            path (str): The recording.
+            pointer (str): The location of its features, ``<pack file>#<sample>`` for packs.
+            key (str): The ``FeatureConfig.key`` the features were extracted with.
+        """
+        with self.__lock, self.__db:
+            self.__db.execute('UPDATE recordings SET features = ?, features_key = ? WHERE path = ?',
+                              (pointer, key, path))
+
+    def load_features(self, row, key=None):
+        """
+        Reads the stored features of a recording.
+
+        Args:
+            row (dict): A recording returned by ``query``.
+            key (str): The required ``FeatureConfig.key``, or None to accept any.
+
+        Returns:
+            numpy.ndarray: The features, or None when none are stored for this key.
+        """
+        from corpus_pack import CorpusPack
+
+        if row['features'] is None or (key is not None and row['features_key'] != key):
+            return None
+        pack, _, i = row['features'].rpartition('#')
+        if pack not in self.__packs:
+            self.__packs[pack] = CorpusPack(pack)
+        return self.__packs[pack].get_features(int(i))
+
+    def query(self, speaker_type=None, min_age=None, max_age=None, word_pair=None, word=None,
+              student_number=None, directory=None, hash=None):
+        """
+        Finds the recordings matching every given condition.
+
+        Returns:
+            list: The matching recordings as dicts, ordered by directory and position.
+        """
+        conditions = []
+        values = []
+        for column, operator, value in [('speaker_type', '=', speaker_type), ('speaker_age', '>=', min_age),
+                                        ('speaker_age', '<=', max_age), ('word_pair', '=', word_pair),
+                                        ('word', '=', word), ('student_number', '=', student_number),
+                                        ('directory', '=', directory), ('hash', '=', hash)]:
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                values.append(value)
+        where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+        with self.__lock:
+            rows = self.__db.execute(f'SELECT * FROM recordings{where} ORDER BY directory, position', values)
+            return [dict(row) for row in rows]
+
+    def directories(self, speaker_type=None, min_age=None, max_age=None):
+        """
+        Returns:
+            list: The directories holding recordings of the given speakers.
+        """
+        return list(dict.fromkeys(row['directory'] for row in self.query(speaker_type, min_age, max_age)))
+
+    def sample(self, row):
+        """
+        Returns:
+            dict: A recording as a ``Testcase`` sample, with its waveform loaded.
+        """
+        import ingest
+
+        return {'name': row['name'], 'student_number': row['student_number'], 'speaker type': row['speaker_type'],
+                'speaker age': row['speaker_age'], 'word pair': row['word_pair'], 'word': row['word'],
+                'wav': ingest.load(row['path'])}
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index the corpus and query it.')
+    parser.add_argument('--db', default='catalog.db', help='catalog database')
+    parser.add_argument('--update', action='store_true', help='index the default directories first')
+    parser.add_argument('--pack', help='point recordings at the features of a corpus pack')
+    parser.add_argument('--type', choices=['M', 'F', 'C'], help='speaker type')
+    parser.add_argument('--age', type=int, nargs=2, metavar=('MIN', 'MAX'), help='speaker age range')
+    parser.add_argument('--pair', type=int, help='word pair')
+    parser.add_argument('--word', type=int, choices=[1, 2], help='word of the pair')
+    parser.add_argument('--directories', action='store_true', help='print directories instead of files')
+    args = parser.parse_args()
+
+    catalog = CorpusCatalog(args.db)
+    if args.update:
+        print('added %d, changed %d, removed %d' % catalog.update(default_directories()))
+    if args.pack:
+        print(f'{catalog.index_pack(args.pack)} recordings point at {args.pack}')
+    min_age, max_age = args.age if args.age else (None, None)
+    if args.directories:
+        for directory in catalog.directories(args.type, min_age, max_age):
+            print(directory)
+    else:
+        for row in catalog.query(args.type, min_age, max_age, args.pair, args.word):
+            print(row['path'])
+    catalog.close()
@@ -0,0 +1,156 @@
+import glob
+import os
+import numpy as np
+import ingest
+from testcase import Testcase
+
+
+class CompactSample:
+    """
+    The metadata of one sample of a ``CompactTestcase`` or a ``CorpusPack``.
+
+    It reads like the sample dicts of ``Testcase`` (``sample['speaker type']``, ``sample['wav']``),
+    but keeps no waveform: ``'mfcc'`` is read from the shared feature array of its owner and
+    ``'wav'`` is decoded from disk on every access.
+    """
+    __slots__ = ('name', 'student_number', 'speaker_type', 'speaker_age', 'word_pair', 'word',
+                 'path', 'owner', 'position')
+
+    Keys = {
+        'name': 'name',
+        'student_number': 'student_number',
+        'speaker type': 'speaker_type',
+        'speaker age': 'speaker_age',
+        'word pair': 'word_pair',
+        'word': 'word',
+        'path': 'path',
+    }
+
+    def __init__(self, info, path, owner, position):
+        self.name = info['name']
+        self.student_number = info['student_number']
+        self.speaker_type = info['speaker type']
+        self.speaker_age = info['speaker age']
+        self.word_pair = info['word pair']
+        self.word = info['word']
+        self.path = path
+        self.owner = owner
+        self.position = position
+
+    def __contains__(self, key):
+        return key in CompactSample.Keys or key in ('mfcc', 'quantized', 'wav')
+
+    def __getitem__(self, key):
+        if key in CompactSample.Keys:
+            return getattr(self, CompactSample.Keys[key])
+        if key == 'mfcc':
+            return self.owner.get_features(self.position)
+        if key == 'quantized':
+            return self.owner.get_quantized(self.position)
+        if key == 'wav':
+            return ingest.load(self.path)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+class CompactTestcase:
+    """
+    A memory-light ``Testcase`` keeping only quantized features.
+
+    The features of all samples are stored back to back in one contiguous array, quantized to
+    int8 with a per-sample scale (or stored as float16), and waveforms are only decoded when a
+    sample's ``'wav'`` is requested. A sample costs about 1 KB instead of the tens of KB of its
+    float32 waveform. Distances are still computed on float32 features, dequantized per sample
+    by ``get_features``.
+    """
+
+    def __init__(self, name, dtype=np.int8):
+        """
+        Args:
+            name (str): The directory of the test case.
+            dtype (type): ``numpy.int8`` or ``numpy.float16``.
+        """
+        # Imported here since recognition itself loads compact test cases
+        from recognition import WordRecognition
+
+        self.__name = name
+        self.__dtype = np.dtype(dtype)
+        self.__features_key = WordRecognition.Features.key()
+        if not os.path.exists(self.__name + '\\Wav'):
+            # Testcase converts the mp3 files on construction
+            Testcase(self.__name)
+
+        files = sorted(glob.glob(self.__name + '\\Wav\\*.wav'))
+        self.__testcases = []
+        matrices = []
+        for position, file in enumerate(files):
+            info = Testcase.extract_information(os.path.basename(os.path.normpath(file)))
+            self.__testcases.append(CompactSample(info, file, self, position))
+            matrices.append(WordRecognition.extract_features(ingest.load(file)).T)
+
+        self.__store(matrices)
+
+    def __store(self, matrices):
+        """
+        Quantizes the (frames, coefficients) matrices into one contiguous array.
+        """
+        lengths = np.array([len(m) for m in matrices], dtype=np.int64)
+        self.__offsets = np.concatenate([[0], np.cumsum(lengths)])
+        stacked = np.concatenate(matrices) if matrices else np.zeros((0, 0), np.float32)
+        if self.__dtype == np.int8:
+            self.__scales = np.array([np.abs(m).max() / 127 if m.size else 1.0 for m in matrices], dtype=np.float32)
+            self.__scales[self.__scales == 0] = 1.0
+            rows = np.repeat(self.__scales, lengths)[:, None]
+            self.__data = np.round(stacked / rows).clip(-127, 127).astype(np.int8)
+        else:
+            self.__scales = np.ones(len(matrices), dtype=np.float32)
+            self.__data = stacked.astype(self.__dtype)
+
+    def get_name(self):
+        return self.__name
+
+    def get_cases(self):
+        return self.__testcases
+
+    def get_case(self, i):
+        return self.__testcases[i]
+
+    def get_main_sample(self):
+        return self.__testcases[46]
+
+    def features_key(self):
+        """
+        Returns:
+            str: The ``FeatureConfig.key`` the features were extracted with.
+        """
+        return self.__features_key
+
+    def get_quantized(self, i):
+        """
+        Returns:
+            tuple: A zero-copy (coefficients, frames) view of the stored features and its scale.
+        """
+        return self.__data[self.__offsets[i]:self.__offsets[i + 1]].T, self.__scales[i]
+
+    def get_features(self, i):
+        """
+        Dequantizes a sample from its stored view into a new float32 matrix.
+
+        Only the storage is compact: DTW runs on this float copy, made on every call and never
+        kept, so the corpus is held quantized while one sample at a time is expanded.
+
+        Returns:
+            numpy.ndarray: The float32 features of a sample.
+        """
+        q, scale = self.get_quantized(i)
+        return q.astype(np.float32) * scale
+
+    def nbytes(self):
+        """
+        Returns:
+            int: The bytes held by the feature storage.
+        """
+        return self.__data.nbytes + self.__offsets.nbytes + self.__scales.nbytes
+
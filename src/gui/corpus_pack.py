@@ -0,0 +1,187 @@
+import argparse
+import glob
+import json
+import os
+import struct
+import numpy as np
+import ingest
+from compact import CompactSample
+from testcase import Testcase
+
+
+class CorpusPack:
+    """
+    A single-file corpus of feature matrices opened with ``numpy.memmap``.
+
+    The file starts with a magic string and the byte offset of its index, followed by the float32
+    (frames, coefficients) matrices of every sample back to back and a JSON index holding the
+    offset, length and metadata of each sample. Samples are zero-copy views into the mapping, so
+    processes opening the same pack share one page-cached copy.
+
+    Attributes:
+        Magic (bytes): The file signature.
+        Extension (str): The extension of pack files.
+    """
+    Magic = b'SRSPACK1'
+    Extension = '.pack'
+    Header = struct.Struct('<8sQ')
+
+    def __init__(self, path):
+        self.__path = path
+        with open(path, 'rb') as f:
+            magic, index_offset = CorpusPack.Header.unpack(f.read(CorpusPack.Header.size))
+            if magic != CorpusPack.Magic:
+                raise ValueError(f'{path} is not a corpus pack')
+            f.seek(index_offset)
+            self.__index = json.loads(f.read().decode('utf-8'))
+
+        rows = self.__index['rows']
+        coefficients = self.__index['coefficients']
+        if rows:
+            self.__data = np.memmap(path, dtype=np.float32, mode='r', offset=CorpusPack.Header.size,
+                                    shape=(rows, coefficients))
+        else:
+            self.__data = np.zeros((0, coefficients), dtype=np.float32)
+
+    def __getstate__(self):
+        # Pickled as its path, so snapshots reopen the mapping instead of copying the features
+        return {'path': self.__path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def get_name(self):
+        return self.__path
+
+    def sources(self):
+        """
+        Returns:
+            list: The directories packed in the file, in packing order.
+        """
+        return list(self.__index['sources'])
+
+    def features_key(self):
+        """
+        Returns:
+            str: The ``FeatureConfig.key`` the features were extracted with, or None for older packs.
+        """
+        return self.__index.get('features')
+
+    def samples(self):
+        """
+        Returns:
+            list: The index entries of every sample.
+        """
+        return self.__index['samples']
+
+    def get_features(self, i):
+        """
+        Returns:
+            numpy.ndarray: A zero-copy (coefficients, frames) view of sample ``i``.
+        """
+        entry = self.__index['samples'][i]
+        return self.__data[entry['offset']:entry['offset'] + entry['length']].T
+
+    def reference(self, speaker_type=None, source=None):
+        """
+        Returns the samples of one packed directory as a reference set.
+
+        Args:
+            speaker_type (str): Use the first directory of this speaker type.
+            source (str): Use this directory.
+
+        Returns:
+            PackedTestcase: The samples of the directory.
+        """
+        for s in self.sources():
+            positions = [i for i, e in enumerate(self.__index['samples']) if e['source'] == s]
+            types = {self.__index['samples'][i]['speaker type'] for i in positions}
+            if (source is None or s == source) and (speaker_type is None or speaker_type in types):
+                return PackedTestcase(self, positions)
+        raise KeyError(f'no packed directory matches {speaker_type or source}')
+
+
+class PackedTestcase:
+    """
+    The samples of one directory of a ``CorpusPack``, with the accessors of ``Testcase``.
+    """
+
+    def __init__(self, pack, positions):
+        self.__pack = pack
+        self.__positions = positions
+        self.__testcases = [CompactSample(pack.samples()[p], pack.samples()[p]['path'], self, p)
+                            for p in positions]
+
+    def get_cases(self):
+        return self.__testcases
+
+    def get_case(self, i):
+        return self.__testcases[i]
+
+    def get_name(self):
+        # The pack file the samples are read from
+        return self.__pack.get_name()
+
+    def get_main_sample(self):
+        return self.__testcases[46]
+
+    def get_features(self, position):
+        return self.__pack.get_features(position)
+
+    def features_key(self):
+        return self.__pack.features_key()
+
+    def get_quantized(self, position):
+        return self.__pack.get_features(position), 1.0
+
+
+def pack_corpus(directories, path):
+    """
+    Extracts the features of every sample of the given directories into one pack file.
+
+    Directories are processed one at a time and their features streamed to the file, so packing
+    needs no more memory than a single ``Testcase``.
+
+    Args:
+        directories (list): The ``Testcase`` directories to pack.
+        path (str): The output file path.
+    """
+    # Imported here since recognition itself opens packs
+    from recognition import WordRecognition
+
+    samples = []
+    sources = []
+    rows = 0
+    coefficients = 0
+    with open(path, 'wb') as f:
+        f.write(CorpusPack.Header.pack(CorpusPack.Magic, 0))
+        for directory in directories:
+            if not os.path.exists(directory + '\\Wav'):
+                # Testcase converts the mp3 files on construction
+                Testcase(directory)
+            sources.append(directory)
+            for file in sorted(glob.glob(directory + '\\Wav\\*.wav')):
+                matrix = np.ascontiguousarray(WordRecognition.extract_features(ingest.load(file)).T, dtype=np.float32)
+                coefficients = matrix.shape[1]
+                f.write(matrix.tobytes())
+
+                entry = Testcase.extract_information(os.path.basename(os.path.normpath(file)))
+                entry.update({'source': directory, 'path': file, 'offset': rows, 'length': len(matrix)})
+                samples.append(entry)
+                rows += len(matrix)
+
+        index_offset = f.tell()
+        index = {'rows': rows, 'coefficients': coefficients, 'sources': sources, 'samples': samples,
+                 'features': WordRecognition.Features.key()}
+        f.write(json.dumps(index).encode('utf-8'))
+        f.seek(0)
+        f.write(CorpusPack.Header.pack(CorpusPack.Magic, index_offset))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack reference directories into a single corpus file.')
+    parser.add_argument('output', help='pack file to write')
+    parser.add_argument('directories', nargs='+', help='Testcase directories')
+    args = parser.parse_args()
+
+    pack_corpus(args.directories, args.output)
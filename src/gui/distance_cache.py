@@ -0,0 +1,122 @@
+import collections
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+
+def fingerprint(features):
+    """
+    Hashes the content, shape and type of a feature matrix.
+
+    Args:
+        features (numpy.ndarray): The feature matrix.
+
+    Returns:
+        str: The hex digest of the matrix.
+    """
+    features = np.ascontiguousarray(features)
+    digest = hashlib.sha1(features.tobytes())
+    digest.update(f'{features.shape}{features.dtype}'.encode())
+    return digest.hexdigest()
+
+
+class DistanceCache:
+    """
+    A memoization cache of DTW distances between feature matrices.
+
+    Distances are keyed by the content hashes of both matrices and the DTW configuration, so
+    the same pair is never aligned twice, whichever file or recording it came from. A memory
+    tier keeps the ``budget`` most recently used entries; an optional SQLite file keeps every
+    entry across sessions and experiments.
+    """
+
+    def __init__(self, budget=100000, path=None, commit_every=256):
+        """
+        Args:
+            budget (int): The number of distances kept in memory.
+            path (str): An SQLite file for the persistent tier, or None for memory only.
+            commit_every (int): The number of new entries written before committing to disk.
+        """
+        self.__budget = budget
+        self.__memory = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.__commit_every = commit_every
+        self.__pending = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__db = None
+        if path is not None:
+            self.__db = sqlite3.connect(path, check_same_thread=False)
+            self.__db.execute('CREATE TABLE IF NOT EXISTS distances (key TEXT PRIMARY KEY, distance REAL)')
+
+    @staticmethod
+    def key(features_1, features_2, config):
+        return f'{fingerprint(features_1)}:{fingerprint(features_2)}:{config}'
+
+    def get(self, key):
+        """
+        Returns:
+            float: The cached distance, or None when the pair was never computed.
+        """
+        with self.__lock:
+            if key in self.__memory:
+                self.__memory.move_to_end(key)
+                self.hits += 1
+                return self.__memory[key]
+
+            if self.__db is not None:
+                row = self.__db.execute('SELECT distance FROM distances WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self.__remember(key, row[0])
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, distance):
+        with self.__lock:
+            self.__remember(key, distance)
+            if self.__db is not None:
+                self.__db.execute('INSERT OR REPLACE INTO distances VALUES (?, ?)', (key, float(distance)))
+                self.__pending += 1
+                if self.__pending >= self.__commit_every:
+                    self.__db.commit()
+                    self.__pending = 0
+
+    def __remember(self, key, distance):
+        self.__memory[key] = distance
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.__budget:
+            self.__memory.popitem(last=False)
+            self.evictions += 1
+
+    def flush(self):
+        with self.__lock:
+            if self.__db is not None:
+                self.__db.commit()
+                self.__pending = 0
+
+    def close(self):
+        self.flush()
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: The hit, miss and eviction counts and the memory hit rate.
+        """
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.__memory),
+            'hit rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
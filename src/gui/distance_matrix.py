@@ -0,0 +1,281 @@
+import argparse
+import glob
+import json
+import os
+import multiprocessing
+import numpy as np
+import ingest
+from testcase import Testcase
+
+# Features of every utterance, set in each worker process by _init_worker
+_features = None
+
+
+def _init_worker(features):
+    global _features
+    _features = features
+
+
+def _compute_block(block):
+    """
+    Aligns every utterance of one directory with every utterance of another, in both directions.
+
+    fastdtw is not symmetric, so the distance of a test to a reference is only the one
+    ``decide_speech_pair`` computes when the test is the first argument.
+
+    Returns:
+        tuple: The directory indexes, the (rows, columns) distances of the rows as tests and the
+        (columns, rows) distances of the columns as tests.
+    """
+    from recognition import WordRecognition
+
+    a, b, rows, columns, scope = block
+    forward = np.full((len(rows), len(columns)), np.nan, dtype=np.float32)
+    backward = np.full((len(columns), len(rows)), np.nan, dtype=np.float32)
+    for i, (row, pair_i) in enumerate(rows):
+        for j, (column, pair_j) in enumerate(columns):
+            if scope == 'pairs' and pair_i != pair_j:
+                continue
+            forward[i, j] = WordRecognition.compare_features(_features[row], _features[column])
+            if a != b:
+                backward[j, i] = WordRecognition.compare_features(_features[column], _features[row])
+    # A directory against itself already holds both directions
+    return a, b, forward, forward if a == b else backward
+
+
+class DistanceMatrix:
+    """
+    Precomputed DTW distances between every utterance of a corpus, and experiments answered from
+    them without any further alignment.
+
+    The matrix lives in a directory holding ``utterances.json`` (the source directory, position
+    and metadata of every row), ``distances.npy`` (an (n, n) float32 array holding at ``[i, j]``
+    the distance of utterance ``i`` as the test to utterance ``j`` as the reference, NaN where a
+    pair was not computed), ``done.npy`` (the directory pairs already computed) and
+    ``scope.json`` (the directories, feature pipeline, DTW settings and pair scope the distances
+    were computed with). Rows follow the sorted order in which ``Testcase`` lists the files of each directory,
+    so row ``start + x`` is the sample ``get_case(x)`` of its directory.
+    """
+
+    def __init__(self, path):
+        self.__path = path
+        with open(os.path.join(path, 'utterances.json'), encoding='utf-8') as f:
+            self.__utterances = json.load(f)
+        self.__distances = np.load(os.path.join(path, 'distances.npy'), mmap_mode='r')
+        self.__sources = []
+        self.__starts = {}
+        for i, u in enumerate(self.__utterances):
+            if u['source'] not in self.__starts:
+                self.__sources.append(u['source'])
+                self.__starts[u['source']] = i
+
+    def sources(self):
+        return list(self.__sources)
+
+    def speaker_type(self, source):
+        return self.__utterances[self.__starts[source] + 46]['speaker type']
+
+    def distance(self, test_source, x, ref_source, y):
+        """
+        Returns the distance between sample ``x`` of one directory and sample ``y`` of another.
+        """
+        return float(self.__distances[self.__starts[test_source] + x, self.__starts[ref_source] + y])
+
+    def pair_decisions(self, test_source, ref_source, threshold=20):
+        """
+        Replays ``WordRecognition.decide_speech_pair`` for the first 45 words of a test directory.
+
+        Returns:
+            list: 1 when the right word of the pair is closer, 0 when the other one is, and -1
+            when the closest is above the threshold.
+        """
+        from recognition import WordRecognition
+
+        decisions = []
+        for x in range(45):
+            d_1 = self.distance(test_source, x, ref_source, x)
+            d_2 = self.distance(test_source, x, ref_source, WordRecognition.partner(x))
+            decisions.append(-1 if min(d_1, d_2) > threshold else int(d_1 <= d_2))
+        return decisions
+
+    def gender_decision(self, test_source, references):
+        """
+        Replays ``WordRecognition.decide_gender`` on the main sample of a test directory.
+
+        Args:
+            references (dict): The reference directory of every speaker type.
+        """
+        return min(references, key=lambda g: self.distance(test_source, 46, references[g], 46))
+
+    def accuracy(self, references, tests, threshold=20):
+        """
+        Returns:
+            dict: The fraction of right pair decisions per speaker type over the test directories.
+        """
+        right = {g: 0 for g in references}
+        total = {g: 0 for g in references}
+        for test in tests:
+            g = self.speaker_type(test)
+            if g not in references or references[g] == test:
+                continue
+            decisions = self.pair_decisions(test, references[g], threshold)
+            right[g] += decisions.count(1)
+            total[g] += len(decisions)
+        return {g: right[g] / total[g] if total[g] else None for g in references}
+
+    def threshold_sweep(self, references, tests, thresholds):
+        """
+        Returns:
+            list: The threshold and accuracy per speaker type for every threshold.
+        """
+        return [(t, self.accuracy(references, tests, t)) for t in thresholds]
+
+    def select_references(self, tests, threshold=20, candidates=None):
+        """
+        Chooses, for every speaker type, the candidate directory giving the best accuracy.
+
+        Args:
+            tests (list): The test directories the references are scored on.
+            threshold (float): The ``decide_speech_pair`` threshold.
+            candidates (list): The directories that may serve as reference, all by default.
+
+        Returns:
+            dict: The best reference directory of every speaker type.
+        """
+        candidates = self.__sources if candidates is None else candidates
+        best = {}
+        for source in candidates:
+            g = self.speaker_type(source)
+            score = self.accuracy({g: source}, [t for t in tests if t != source], threshold)[g]
+            if score is not None and (g not in best or score > best[g][1]):
+                best[g] = (source, score)
+        return {g: source for g, (source, score) in best.items()}
+
+    def leave_one_speaker_out(self, threshold=20):
+        """
+        Holds out every directory in turn, selects the references on the others and scores the
+        held out speaker with them.
+
+        Returns:
+            dict: The references chosen and the accuracy of every held out directory.
+        """
+        results = {}
+        for held_out in self.__sources:
+            others = [s for s in self.__sources if s != held_out]
+            references = self.select_references(others, threshold, others)
+            g = self.speaker_type(held_out)
+            if g in references:
+                results[held_out] = (references, self.accuracy({g: references[g]}, [held_out], threshold)[g])
+        return results
+
+
+def build_distance_matrix(directories, path, processes=None, scope='all', reset=False):
+    """
+    Computes the distance matrix of the given directories, resuming an interrupted run.
+
+    Work is split into blocks of one directory against another, aligned in parallel and saved to
+    ``distances.npy`` as soon as each block completes, so a rerun only computes the missing
+    blocks. Both directions of every pair of utterances are aligned, as fastdtw is not
+    symmetric and replays must match the live decisions.
+    A run only resumes a matrix of the same directories, feature pipeline, DTW settings and
+    scope, as recorded in ``scope.json``; any other matrix is refused unless ``reset`` is set.
+
+    Args:
+        directories (list): The ``Testcase`` directories.
+        path (str): The output directory.
+        processes (int): The number of worker processes, all cores by default.
+        scope (str): 'all' for every pair of utterances, 'pairs' only for utterances at the
+            positions of the same word pair, which is all ``decide_speech_pair`` and
+            ``decide_gender`` experiments need.
+        reset (bool): Whether to delete a matrix of another scope and start over.
+
+    Raises:
+        ValueError: If the output directory holds a matrix of another scope and ``reset`` is not set.
+    """
+    from recognition import WordRecognition
+
+    os.makedirs(path, exist_ok=True)
+    index_file = os.path.join(path, 'utterances.json')
+    scope_file = os.path.join(path, 'scope.json')
+    matrix_file = os.path.join(path, 'distances.npy')
+    done_file = os.path.join(path, 'done.npy')
+    experiment = {'directories': sorted(directories), 'features': WordRecognition.Features.key(),
+                  'dtw': WordRecognition.DTWConfig, 'scope': scope, 'directions': 'both'}
+
+    files = [index_file, os.path.join(path, 'features.npz'), matrix_file, done_file, scope_file]
+    if any(os.path.exists(file) for file in files):
+        stored = None
+        if os.path.exists(scope_file):
+            with open(scope_file, encoding='utf-8') as f:
+                stored = json.load(f)
+        if stored != experiment:
+            if not reset:
+                raise ValueError(f'{path} holds a matrix computed with {stored}, not {experiment}')
+            for file in files:
+                if os.path.exists(file):
+                    os.remove(file)
+    if not os.path.exists(scope_file):
+        with open(scope_file, 'w', encoding='utf-8') as f:
+            json.dump(experiment, f, ensure_ascii=False)
+
+    if os.path.exists(index_file):
+        with open(index_file, encoding='utf-8') as f:
+            utterances = json.load(f)
+        with np.load(os.path.join(path, 'features.npz')) as data:
+            features = [data[f'f{i}'] for i in range(len(utterances))]
+    else:
+        utterances = []
+        features = []
+        for directory in directories:
+            if not os.path.exists(directory + '\\Wav'):
+                # Testcase converts the mp3 files on construction
+                Testcase(directory)
+            for file in sorted(glob.glob(directory + '\\Wav\\*.wav')):
+                u = Testcase.extract_information(os.path.basename(os.path.normpath(file)))
+                u['source'] = directory
+                utterances.append(u)
+                features.append(WordRecognition.extract_features(ingest.load(file)))
+        np.savez(os.path.join(path, 'features.npz'), config=np.array(WordRecognition.Features.key()),
+                 **{f'f{i}': f for i, f in enumerate(features)})
+        with open(index_file, 'w', encoding='utf-8') as f:
+            json.dump(utterances, f, ensure_ascii=False)
+
+    n = len(utterances)
+    sources = list(dict.fromkeys(u['source'] for u in utterances))
+    # Samples are paired by position, as decide_speech_pair compares sample x with x and its partner
+    members = {s: [] for s in sources}
+    for i, u in enumerate(utterances):
+        members[u['source']].append((i, len(members[u['source']]) // 2))
+
+    if os.path.exists(matrix_file):
+        distances = np.load(matrix_file, mmap_mode='r+')
+        done = np.load(done_file)
+    else:
+        distances = np.lib.format.open_memmap(matrix_file, mode='w+', dtype=np.float32, shape=(n, n))
+        distances[:] = np.nan
+        done = np.zeros((len(sources), len(sources)), dtype=bool)
+
+    blocks = [(a, b, members[sources[a]], members[sources[b]], scope)
+              for a in range(len(sources)) for b in range(a, len(sources)) if not done[a, b]]
+
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(features,)) as pool:
+        for a, b, forward, backward in pool.imap_unordered(_compute_block, blocks):
+            rows = [i for i, _ in members[sources[a]]]
+            columns = [j for j, _ in members[sources[b]]]
+            distances[np.ix_(rows, columns)] = forward
+            distances[np.ix_(columns, rows)] = backward
+            distances.flush()
+            done[a, b] = done[b, a] = True
+            np.save(done_file, done)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute the utterance distance matrix.')
+    parser.add_argument('output', help='directory holding the matrix')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes')
+    parser.add_argument('--scope', choices=['all', 'pairs'], default='all', help='pairs of utterances to align')
+    parser.add_argument('--reset', action='store_true', help='start over when the output holds another scope')
+    args = parser.parse_args()
+
+    directories = [file + '\\Segments' for file in glob.glob('Testcases/*')] + glob.glob('Segments/*')
+    build_distance_matrix(sorted(directories), args.output, args.processes, args.scope, args.reset)
@@ -0,0 +1,125 @@
+import numpy as np
+
+
+def _local_costs(X, Y, i):
+    """
+    Returns the euclidean distances between frame ``i`` of ``X`` and every frame of ``Y``.
+    """
+    return np.sqrt(np.maximum(((Y - X[:, i:i + 1]) ** 2).sum(axis=0), 0))
+
+
+def _next_row(previous, costs):
+    """
+    Computes one row of the accumulated cost from the previous row.
+
+    The recurrence ``D[i, j] = C[i, j] + min(D[i-1, j-1], D[i-1, j], D[i, j-1])`` runs along the
+    row as a running minimum over prefix sums, so a row is a few vectorized operations.
+    """
+    if previous is None:
+        return np.cumsum(costs)
+    entry = np.minimum(np.concatenate([[np.inf], previous[:-1]]), previous)
+    prefix = np.cumsum(costs)
+    return prefix + np.minimum.accumulate(entry - (prefix - costs))
+
+
+def cost_rows(X, Y, start=0, previous=None):
+    """
+    Yields the rows of the accumulated cost matrix of ``X`` against ``Y`` one at a time.
+
+    Args:
+        X (numpy.ndarray): Features with shape (coefficients, n).
+        Y (numpy.ndarray): Features with shape (coefficients, m).
+        start (int): The first row to compute.
+        previous (numpy.ndarray): Row ``start - 1``, when ``start`` is not 0.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    for i in range(start, X.shape[1]):
+        previous = _next_row(previous, _local_costs(X, Y, i))
+        yield previous
+
+
+class DTWView:
+    """
+    The accumulated cost of aligning two feature matrices, as much of it as a plot needs.
+
+    The full (n, m) matrix is never held. One streaming pass keeps a tile of at most ``tile``
+    sampled rows and columns for display, the last row for the cost curve and a checkpoint row
+    every ``sqrt(n)`` rows. The warping path is then backtracked exactly, recomputing one block
+    of rows between checkpoints at a time, so memory grows with ``sqrt(n) * m`` instead of
+    ``n * m`` and rendering cost is fixed by the tile size. Costs and path match
+    ``librosa.sequence.dtw`` with its default steps and euclidean metric.
+    """
+
+    def __init__(self, X, Y, tile=400):
+        """
+        Args:
+            X (numpy.ndarray): Features with shape (coefficients, n), shown along the rows.
+            Y (numpy.ndarray): Features with shape (coefficients, m), shown along the columns.
+            tile (int): The largest number of rows and columns of the displayed tile.
+        """
+        self.X = np.asarray(X, dtype=np.float64)
+        self.Y = np.asarray(Y, dtype=np.float64)
+        n, m = self.X.shape[1], self.Y.shape[1]
+        self.rows = np.unique(np.linspace(0, n - 1, min(tile, n)).round().astype(int))
+        self.columns = np.unique(np.linspace(0, m - 1, min(tile, m)).round().astype(int))
+        self.tile = np.empty((len(self.rows), len(self.columns)))
+        self.__block = max(1, int(np.ceil(np.sqrt(n))))
+        self.__checkpoints = {}
+
+        sampled = {r: k for k, r in enumerate(self.rows)}
+        for i, row in enumerate(cost_rows(self.X, self.Y)):
+            if i in sampled:
+                self.tile[sampled[i]] = row[self.columns]
+            if (i + 1) % self.__block == 0:
+                self.__checkpoints[i] = row
+            self.last_row = row
+        self.__path = None
+
+    def __rows(self, first, last):
+        """
+        Recomputes rows ``first`` to ``last`` from the checkpoint before them.
+        """
+        previous = self.__checkpoints.get(first - 1)
+        return list(cost_rows(self.X[:, :last + 1], self.Y, first, previous))
+
+    def path(self):
+        """
+        Returns:
+            numpy.ndarray: The (row, column) pairs of the optimal warping path, from the end to
+            the start like ``librosa.sequence.dtw``.
+        """
+        if self.__path is not None:
+            return self.__path
+        i, j = self.X.shape[1] - 1, self.Y.shape[1] - 1
+        path = [(i, j)]
+        while i > 0 or j > 0:
+            first = (i // self.__block) * self.__block
+            block = self.__rows(first, i)
+            previous = self.__checkpoints.get(first - 1)
+            # Walk back while the path stays within this block of rows
+            while (i > 0 or j > 0) and i >= first:
+                if i == 0:
+                    j -= 1
+                elif j == 0:
+                    i -= 1
+                else:
+                    above = block[i - first - 1] if i > first else previous
+                    # Same preference as librosa's step order: diagonal, left, up
+                    step = int(np.argmin([above[j - 1], block[i - first][j - 1], above[j]]))
+                    if step == 0:
+                        i, j = i - 1, j - 1
+                    elif step == 1:
+                        j -= 1
+                    else:
+                        i -= 1
+                path.append((i, j))
+        self.__path = np.array(path)
+        return self.__path
+
+    def nbytes(self):
+        """
+        Returns:
+            int: The bytes held for display and backtracking.
+        """
+        return self.tile.nbytes + sum(r.nbytes for r in self.__checkpoints.values()) + self.last_row.nbytes
@@ -0,0 +1,200 @@
+import numpy as np
+from batch_dtw import batch_dtw
+from dtw_view import cost_rows
+
+
+def remaining_bounds(X, Y):
+    """
+    Lower bounds the cost the rows after every row of ``X`` still add to a DTW alignment with ``Y``.
+
+    Every later row adds at least one cell, and a frame is never closer to a frame of ``Y`` than
+    to the bounding box of all of them, so the suffix sums of the box distances bound the rest
+    of the alignment from below.
+
+    Returns:
+        numpy.ndarray: ``n + 1`` bounds, entry ``i`` bounding the cost of rows ``i`` to ``n - 1``.
+    """
+    low = Y.min(axis=1, keepdims=True)
+    high = Y.max(axis=1, keepdims=True)
+    outside = np.maximum(np.maximum(low - X, X - high), 0)
+    box = np.sqrt((outside ** 2).sum(axis=0))
+    return np.concatenate([np.cumsum(box[::-1])[::-1], [0.0]])
+
+
+class IncrementalAlignment:
+    """
+    An exact DTW alignment computed one row at a time, with a lower bound of its final distance.
+    """
+
+    def __init__(self, X, Y):
+        self.__rows = cost_rows(X, Y)
+        self.__rest = remaining_bounds(np.asarray(X, dtype=np.float64), np.asarray(Y, dtype=np.float64))
+        self.n = X.shape[1]
+        self.m = Y.shape[1]
+        self.done = 0
+        self.distance = None
+        self.__best = 0.0
+
+    def lower_bound(self):
+        """
+        Returns:
+            float: The smallest final distance still possible, or the distance once finished.
+        """
+        if self.distance is not None:
+            return self.distance
+        return self.__best + self.__rest[self.done]
+
+    def step(self):
+        """
+        Computes the next row.
+        """
+        row = next(self.__rows)
+        self.done += 1
+        self.__best = row.min()
+        if self.done == self.n:
+            self.distance = float(row[-1])
+
+
+class EarlyExitStats:
+    """
+    Accumulates the work done by early-exit decisions.
+
+    Attributes:
+        decisions (int): The number of decisions.
+        early (int): The decisions taken before every alignment finished.
+        cells (int): The cost matrix cells computed.
+        total_cells (int): The cells full alignments would have computed.
+    """
+
+    def __init__(self):
+        self.decisions = 0
+        self.early = 0
+        self.cells = 0
+        self.total_cells = 0
+
+    def add(self, cells, total_cells):
+        self.decisions += 1
+        self.early += cells < total_cells
+        self.cells += cells
+        self.total_cells += total_cells
+
+    def report(self):
+        """
+        Returns:
+            dict: The share of decisions taken early and the fraction of cells not computed.
+        """
+        return {
+            'decisions': self.decisions,
+            'early': self.early / self.decisions if self.decisions else 0.0,
+            'saved': 1 - self.cells / self.total_cells if self.total_cells else 0.0,
+        }
+
+
+def _bounds(alignments):
+    """
+    Returns the lower and upper bounds of the distance to a reference, the closest of its templates.
+    """
+    lower = min(a.lower_bound() for a in alignments)
+    finished = [a.distance for a in alignments if a.distance is not None]
+    return lower, min(finished) if finished else np.inf
+
+
+def _outcome(bounds, thresholds):
+    """
+    Returns the decision the bounds already imply, or None while it can still change.
+
+    The decision follows ``decide_speech_pair``: the closer reference wins, the first one on
+    ties, and the test is rejected when the winner is above its own threshold.
+    """
+    (low_1, high_1), (low_2, high_2) = bounds
+    t_1, t_2 = thresholds
+    if low_1 > t_1 and low_2 > t_2:
+        return -1
+    if high_1 <= low_2:
+        if high_1 <= t_1:
+            return 1
+        if low_1 > t_1:
+            return -1
+    if high_2 < low_1:
+        if high_2 <= t_2:
+            return 0
+        if low_2 > t_2:
+            return -1
+    return None
+
+
+def decide_pair(features, r_1, r_2, thresholds):
+    """
+    Decides between two references, stopping as soon as the decision can no longer change.
+
+    The alignments with every template of both references advance one row at a time, always
+    the one with the smallest lower bound, as it is the one that can still change the outcome.
+
+    Args:
+        features (numpy.ndarray): The test features.
+        r_1 (list): The templates of the expected word.
+        r_2 (list): The templates of the other word of the pair.
+        thresholds (tuple): The rejection thresholds of both words.
+
+    Returns:
+        tuple: The decision, the cells computed and the cells full alignments need.
+    """
+    alignments = [[IncrementalAlignment(features, t) for t in r] for r in (r_1, r_2)]
+    everything = alignments[0] + alignments[1]
+    while True:
+        decision = _outcome([_bounds(a) for a in alignments], thresholds)
+        if decision is not None:
+            break
+        min(everything, key=lambda a: np.inf if a.distance is not None else a.lower_bound()).step()
+
+    cells = sum(a.done * a.m for a in everything)
+    return decision, cells, sum(a.n * a.m for a in everything)
+
+
+def calibrate(references, others=(), margin=0.5, default=20.0):
+    """
+    Calibrates the rejection threshold of every word of a reference set.
+
+    Genuine distances are those between a word and the same word of the other reference sets;
+    impostor distances are those between a word and every word of its own set outside its pair.
+    The threshold sits ``margin`` of the way from the median genuine distance to the closest
+    impostor, so a test is only rejected once it is further from the word than a different
+    word would be.
+
+    Args:
+        references (list): The templates of every word of the reference set.
+        others (list): The templates of every word of the other reference sets.
+        margin (float): The position of the threshold between the two distances.
+        default (float): The threshold of words without impostors.
+
+    Returns:
+        list: The threshold of every word.
+    """
+    # Imported here since recognition itself loads this module
+    from recognition import WordRecognition
+
+    words = len(references)
+    jobs = []
+    for i in range(words):
+        for j in range(words):
+            if j not in (i, WordRecognition.partner(i)):
+                jobs += [(i, 'impostor', a, b) for a in references[i] for b in references[j]]
+        for other in others:
+            if i < len(other):
+                jobs += [(i, 'genuine', a, b) for a in references[i] for b in other[i]]
+
+    distances = batch_dtw([(a, b) for _, _, a, b in jobs])
+    genuine = [[] for _ in range(words)]
+    impostor = [[] for _ in range(words)]
+    for (i, kind, _, _), d in zip(jobs, distances):
+        (genuine if kind == 'genuine' else impostor)[i].append(d)
+
+    thresholds = []
+    for i in range(words):
+        if not impostor[i]:
+            thresholds.append(default)
+            continue
+        closest = min(impostor[i])
+        typical = float(np.median(genuine[i])) if genuine[i] else 0.0
+        thresholds.append(typical + margin * (closest - typical) if closest > typical else closest)
+    return thresholds
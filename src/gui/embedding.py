@@ -0,0 +1,104 @@
+import numpy as np
+
+
+def embed(features, points=8):
+    """
+    Summarizes a feature matrix as a fixed-length, unit-norm vector.
+
+    The vector holds the mean and standard deviation of every coefficient over time followed by
+    the trajectory linearly resampled to ``points`` frames, so utterances of any length can be
+    compared with a single dot product.
+
+    Args:
+        features (numpy.ndarray): The features with shape (coefficients, frames).
+        points (int): The number of frames the trajectory is resampled to.
+
+    Returns:
+        numpy.ndarray: The float32 embedding with ``coefficients * (points + 2)`` values.
+    """
+    frames = features.shape[1]
+    positions = np.linspace(0, frames - 1, points)
+    trajectory = np.stack([np.interp(positions, np.arange(frames), row) for row in features])
+    vector = np.concatenate([features.mean(axis=1), features.std(axis=1), trajectory.ravel()])
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).astype(np.float32)
+
+
+class EmbeddingIndex:
+    """
+    A vectorized index of utterance embeddings returning candidate labels by cosine similarity.
+
+    Searches are a single matrix product over all rows. With ``partitions`` the rows are
+    clustered with spherical k-means once, and a search only scans the rows of the ``probes``
+    closest clusters (an inverted file index), which keeps large pools fast.
+    """
+
+    def __init__(self, vectors, labels, partitions=None, iterations=20):
+        """
+        Args:
+            vectors (numpy.ndarray): The embeddings, one row per reference sample.
+            labels (numpy.ndarray): The label of every row.
+            partitions (int): The number of k-means clusters, or None for a brute force index.
+            iterations (int): The maximum number of k-means iterations.
+        """
+        self.__vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.__labels = np.asarray(labels)
+        self.__centroids = None
+        self.__lists = None
+        if partitions is not None and partitions < len(self.__vectors):
+            self.__partition(partitions, iterations)
+
+    def __len__(self):
+        return len(self.__vectors)
+
+    def __partition(self, k, iterations):
+        """
+        Clusters the rows with spherical k-means and keeps the rows of every cluster.
+        """
+        rng = np.random.default_rng(0)
+        centroids = self.__vectors[rng.choice(len(self.__vectors), k, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(self.__vectors @ centroids.T, axis=1)
+            updated = np.zeros_like(centroids)
+            np.add.at(updated, assignment, self.__vectors)
+            norms = np.linalg.norm(updated, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            updated = np.where(norms > 0, updated / np.maximum(norms, 1e-12), centroids)
+            if np.allclose(updated, centroids):
+                break
+            centroids = updated
+
+        self.__centroids = centroids
+        assignment = np.argmax(self.__vectors @ centroids.T, axis=1)
+        self.__lists = [np.flatnonzero(assignment == c) for c in range(k)]
+
+    def search(self, query, k, probes=2):
+        """
+        Returns the labels of the rows most similar to the query.
+
+        Args:
+            query (numpy.ndarray): The query embedding.
+            k (int): The number of distinct labels to return.
+            probes (int): The number of clusters scanned when the index is partitioned.
+
+        Returns:
+            list: At most ``k`` distinct labels, most similar first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if self.__centroids is None:
+            rows = None
+            scores = self.__vectors @ query
+        else:
+            nearest = np.argsort(self.__centroids @ query)[::-1][:probes]
+            rows = np.concatenate([self.__lists[c] for c in nearest])
+            scores = self.__vectors[rows] @ query
+
+        labels = self.__labels if rows is None else self.__labels[rows]
+        found = []
+        for i in np.argsort(scores)[::-1]:
+            label = labels[i].item()
+            if label not in found:
+                found.append(label)
+                if len(found) == k:
+                    break
+        return found
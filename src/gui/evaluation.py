@@ -0,0 +1,177 @@
+import argparse
+import csv
+import os
+from glob import glob
+from compact import CompactTestcase
+from recognition import WordRecognition, WordsList
+from testcase import Testcase
+
+Fields = ['directory', 'index', 'name', 'speaker type', 'decision']
+
+Reports = {
+    'M': ('males.csv', 'Males'),
+    'F': ('females.csv', 'Females'),
+    'C': ('children.csv', 'Children'),
+}
+
+
+def read_rows(log_path):
+    """
+    Reads the result rows of an evaluation log, skipping a row cut short by a crash.
+
+    Args:
+        log_path (str): The row log written by ``run_evaluation``.
+
+    Returns:
+        list: The result rows as dicts, with ``index`` and ``decision`` as ints.
+    """
+    rows = []
+    if not os.path.exists(log_path):
+        return rows
+    with open(log_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                row['index'] = int(row['index'])
+                row['decision'] = int(row['decision'])
+            except (TypeError, ValueError):
+                continue
+            rows.append(row)
+    return rows
+
+
+def completed(log_path):
+    """
+    Returns:
+        dict: The indices already logged for every directory.
+    """
+    done = {}
+    for row in read_rows(log_path):
+        done.setdefault(row['directory'], set()).add(row['index'])
+    return done
+
+
+def open_log(log_path):
+    """
+    Opens a row log for appending, writing its header when it is new.
+
+    Returns:
+        tuple: The open file and a ``csv.DictWriter`` over it.
+    """
+    new = not os.path.exists(log_path) or os.path.getsize(log_path) == 0
+    f = open(log_path, 'a', newline='', encoding='utf-8')
+    writer = csv.DictWriter(f, fieldnames=Fields)
+    if new:
+        writer.writeheader()
+    elif not _ends_with_newline(log_path):
+        # Terminate a row cut short by a crash so it is skipped on reading
+        f.write('\n')
+    return f, writer
+
+
+def run_evaluation(wr, directories, log_path, words=45, compact=False):
+    """
+    Evaluates ``decide_speech_pair`` over test directories, streaming results to a row log.
+
+    Directories are loaded one at a time and every decision is appended to the log as soon as
+    it is made, so memory does not grow with the corpus and an interrupted run resumes after
+    the last logged sample.
+
+    Args:
+        wr (WordRecognition): The recognizer holding the references.
+        directories (list): The test directories.
+        log_path (str): The row log, created or appended to.
+        words (int): The number of words evaluated per directory.
+        compact (bool): Whether to load directories as ``CompactTestcase``. Its quantized
+            features only save memory; distances near the threshold may differ slightly from
+            the full precision ``Testcase`` runs.
+    """
+    done = completed(log_path)
+    f, writer = open_log(log_path)
+    with f:
+        for directory in directories:
+            finished = done.get(directory, set())
+            if len(finished) >= words:
+                continue
+
+            test = CompactTestcase(directory) if compact else Testcase(directory)
+            remaining = [x for x in range(words) if x not in finished]
+            genders = {x: test.get_case(x)['speaker type'] for x in remaining}
+            # One call per speaker type, so the batch kernel aligns the whole directory at once
+            decisions = {}
+            for g in dict.fromkeys(genders.values()):
+                indices = [x for x in remaining if genders[x] == g]
+                decisions.update(zip(indices, wr.decide_speech_pairs(test, g, indices)))
+
+            for x in remaining:
+                sample = test.get_case(x)
+                g = genders[x]
+                m = decisions[x]
+                if m == 0:
+                    print(f"Wrong Case [{sample['name']}  {g}  =>{sample['speaker type']}]")
+                elif m == -1:
+                    print(f"Others Case [{sample['name']}  {g}  =>{sample['speaker type']}]")
+
+                writer.writerow({'directory': directory, 'index': x, 'name': sample['name'],
+                                 'speaker type': g, 'decision': m})
+                f.flush()
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def summarize(log_path, output_dir='.', words=45):
+    """
+    Derives the per-gender summary reports from an evaluation row log.
+
+    Args:
+        log_path (str): The row log written by ``run_evaluation``.
+        output_dir (str): The directory receiving ``males.csv``, ``females.csv`` and
+            ``children.csv``.
+        words (int): The number of words evaluated per directory.
+    """
+    # pandas is only needed to write the reports
+    import pandas as pd
+
+    counts = {g: [{1: 0, 0: 0, -1: 0} for _ in range(words)] for g in Reports}
+    for row in read_rows(log_path):
+        if row['speaker type'] in counts and row['index'] < words:
+            counts[row['speaker type']][row['index']][row['decision']] += 1
+
+    pair = [int(x + 2) // 2 for x in range(words)]
+    word_index = [(x + 2) % 2 + 1 for x in range(words)]
+    word = [WordsList[x] for x in range(words)]
+    for g, (file, title) in Reports.items():
+        c = counts[g]
+        right = [c[x][1] for x in range(words)]
+        wrong = [c[x][0] for x in range(words)]
+        others = [c[x][-1] for x in range(words)]
+        report = {
+            'Pair': pair,
+            'pair number': word_index,
+            'Word': word,
+            title: [right[x] + wrong[x] + others[x] for x in range(words)],
+            'others': others,
+            'word 2': [wrong[x] if word_index[x] == 1 else right[x] for x in range(words)],
+            'word 1': [right[x] if word_index[x] == 1 else wrong[x] for x in range(words)],
+            'correct': right,
+            'wrong': [wrong[x] + others[x] for x in range(words)],
+        }
+        pd.DataFrame(report).to_csv(os.path.join(output_dir, file), index=False, encoding='utf-8-sig')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the recognizer on the test cases.')
+    parser.add_argument('--compact', action='store_true', help='keep test features quantized to save memory')
+    args = parser.parse_args()
+
+    wr = WordRecognition()
+    directories = [file + '\\Segments' for file in sorted(glob('Testcases/*'))]
+    run_evaluation(wr, directories, 'results.csv', compact=args.compact)
+    summarize('results.csv')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import numpy as np
+
+
+def euclidean(u, v):
+    """
+    The distance between two feature frames, equal to ``scipy.spatial.distance.euclidean`` up to
+    rounding but without the import cost of ``scipy.spatial``.
+    """
+    return np.linalg.norm(u - v)
+
+
+def normalize_frames(features):
+    """
+    Removes the mean of every frame and scales it to a peak of one.
+
+    Args:
+        features (numpy.ndarray): Features with shape (coefficients, frames).
+
+    Returns:
+        numpy.ndarray: The normalized features.
+    """
+    centered = features - features.mean(axis=0, keepdims=True)
+    return centered / np.abs(centered).max(axis=0, keepdims=True)
+
+
+class FeatureConfig:
+    """
+    The declarative feature pipeline shared by recognition, the caches and the plots.
+
+    Features are computed in a fixed order: ``n_mfcc`` MFCCs over ``n_fft`` sample windows every
+    ``hop_length`` samples, optionally stacked with their deltas up to order ``deltas``, normalized
+    per frame, optionally projected on ``dims`` PCA or LDA components fitted on the reference
+    corpus, and finally averaged over groups of ``decimation`` frames. DTW cost grows with
+    frames² × dimensions, so the hop, the decimation and the projection are the speed levers.
+
+    The defaults reproduce the original 20 MFCCs at hop 512. ``key`` hashes every parameter and
+    the fitted projection, and is stored with features cached on disk so stale ones are detected.
+    """
+    Version = 1
+
+    def __init__(self, n_mfcc=20, hop_length=512, n_fft=2048, deltas=0, projection=None, dims=None,
+                 decimation=1):
+        """
+        Args:
+            n_mfcc (int): The number of MFCCs.
+            hop_length (int): The hop between frames in samples.
+            n_fft (int): The analysis window in samples.
+            deltas (int): The highest delta order appended, 0 for none.
+            projection (str): None, 'pca' or 'lda'.
+            dims (int): The number of projected dimensions.
+            decimation (int): The number of consecutive frames averaged into one.
+        """
+        if projection not in (None, 'pca', 'lda'):
+            raise ValueError(f'unknown projection {projection}')
+        self.n_mfcc = n_mfcc
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.deltas = deltas
+        self.projection = projection
+        self.dims = dims
+        self.decimation = decimation
+        self.__mean = None
+        self.__basis = None
+        self.__key = None
+
+    @property
+    def frame_step(self):
+        """
+        int: The samples between two output frames.
+        """
+        return self.hop_length * self.decimation
+
+    def parameters(self):
+        """
+        Returns:
+            dict: The parameters of the pipeline.
+        """
+        return {'version': FeatureConfig.Version, 'n_mfcc': self.n_mfcc, 'hop_length': self.hop_length,
+                'n_fft': self.n_fft, 'deltas': self.deltas, 'projection': self.projection, 'dims': self.dims,
+                'decimation': self.decimation}
+
+    def key(self):
+        """
+        Returns:
+            str: A short hash of the parameters and the fitted projection.
+        """
+        if self.__key is None:
+            h = hashlib.sha1(json.dumps(self.parameters(), sort_keys=True).encode())
+            if self.__basis is not None:
+                h.update(self.__mean.tobytes())
+                h.update(self.__basis.tobytes())
+            self.__key = h.hexdigest()[:16]
+        return self.__key
+
+    def is_fitted(self):
+        return self.projection is None or self.__basis is not None
+
+    def mfcc(self, x, sr):
+        """
+        Returns:
+            numpy.ndarray: The raw MFCCs of the audio data, as shown by the plots.
+        """
+        # librosa takes seconds to import, and workers reading stored features never need it
+        import librosa
+        return librosa.feature.mfcc(y=x, sr=sr, n_mfcc=self.n_mfcc, hop_length=self.hop_length, n_fft=self.n_fft)
+
+    def frames(self, x, sr):
+        """
+        Returns:
+            numpy.ndarray: The normalized frames before projection and decimation.
+        """
+        mfcc = self.mfcc(x, sr)
+        if self.deltas:
+            import librosa
+            mfcc = np.concatenate([mfcc] + [librosa.feature.delta(mfcc, order=o, mode='nearest')
+                                            for o in range(1, self.deltas + 1)])
+        return normalize_frames(mfcc)
+
+    def extract(self, x, sr):
+        """
+        Runs the whole pipeline on audio data.
+
+        Args:
+            x (numpy.ndarray): The audio data.
+            sr (int): The sample rate of the audio data.
+
+        Returns:
+            numpy.ndarray: The features with shape (coefficients, frames).
+        """
+        if not self.is_fitted():
+            raise ValueError(f'the {self.projection} projection is not fitted')
+        features = self.frames(x, sr)
+        if self.__basis is not None:
+            features = (self.__basis.T @ (features - self.__mean[:, None])).astype(features.dtype)
+        if self.decimation > 1:
+            features = self.__decimate(features)
+        return features
+
+    def __decimate(self, features):
+        n = features.shape[1]
+        groups = np.arange(n) // self.decimation
+        sums = np.zeros((features.shape[0], groups[-1] + 1 if n else 0), dtype=features.dtype)
+        np.add.at(sums.T, groups, features.T)
+        return sums / np.bincount(groups)
+
+    def fit(self, waveforms, labels, sr):
+        """
+        Fits the projection on the frames of the reference corpus.
+
+        PCA keeps the directions of largest variance of all frames; LDA keeps the directions that
+        best separate the frames of different words.
+
+        Args:
+            waveforms (list): The audio data of the reference samples.
+            labels (list): The word of every waveform, used by LDA.
+            sr (int): The sample rate of the audio data.
+        """
+        if self.projection is None:
+            return
+        matrices = [self.frames(x, sr) for x in waveforms]
+        frames = np.concatenate([m.T for m in matrices]).astype(np.float64)
+        mean = frames.mean(axis=0)
+        centered = frames - mean
+        dims = self.dims or min(12, frames.shape[1])
+
+        if self.projection == 'pca':
+            _, _, vt = np.linalg.svd(centered, full_matrices=False)
+            basis = vt[:dims].T
+        else:
+            frame_labels = np.concatenate([[label] * m.shape[1] for m, label in zip(matrices, labels)])
+            within = np.zeros((frames.shape[1], frames.shape[1]))
+            between = np.zeros_like(within)
+            for label in np.unique(frame_labels):
+                members = centered[frame_labels == label]
+                offset = members.mean(axis=0)
+                within += (members - offset).T @ (members - offset)
+                between += len(members) * np.outer(offset, offset)
+            # Regularized so silent or constant coefficients keep the problem definite
+            within += 1e-6 * np.trace(within) / len(within) * np.eye(len(within))
+            import scipy.linalg
+            values, vectors = scipy.linalg.eigh(between, within)
+            basis = vectors[:, np.argsort(values)[::-1][:dims]]
+
+        self.__mean = mean.astype(np.float32)
+        self.__basis = basis.astype(np.float32)
+        self.__key = None
+
+    def save(self, path):
+        """
+        Writes the parameters and the fitted projection to an ``.npz`` file.
+        """
+        arrays = {'parameters': np.array(json.dumps(self.parameters()))}
+        if self.__basis is not None:
+            arrays.update(mean=self.__mean, basis=self.__basis)
+        np.savez(path, **arrays)
+
+    @staticmethod
+    def load(path):
+        """
+        Returns:
+            FeatureConfig: The configuration written by ``save``.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            parameters = json.loads(str(data['parameters']))
+            if parameters.pop('version') != FeatureConfig.Version:
+                raise ValueError(f'{path} was written by another feature pipeline version')
+            config = FeatureConfig(**parameters)
+            if 'basis' in data:
+                config.__mean = data['mean']
+                config.__basis = data['basis']
+        return config
@@ -0,0 +1,150 @@
+import collections
+import hashlib
+import io
+import os
+import threading
+import numpy as np
+import soundfile
+
+SampleRate = 16000
+
+
+class AudioIngest:
+    """
+    The single entry point turning audio files into recognizer-ready signals.
+
+    Every source is decoded once, downmixed to mono, converted to float32 and resampled to the
+    recognizer rate. Results are cached by the hash of the file content and the target rate, in
+    memory up to a byte budget (least recently used first out) and optionally as ``.npy`` files,
+    so re-opening a file, even under another name, never decodes or resamples it again.
+
+    Cached signals are shared between callers and therefore read-only.
+    """
+
+    def __init__(self, sr=SampleRate, cache_dir=None, budget=256 * 1024 * 1024):
+        """
+        Args:
+            sr (int): The rate every signal is resampled to.
+            cache_dir (str): A directory for the on-disk cache, or None to keep it in memory only.
+            budget (int): The bytes of decoded audio kept in memory.
+        """
+        self.__sr = sr
+        self.__cache_dir = cache_dir
+        self.__budget = budget
+        self.__size = 0
+        self.__cache = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get_rate(self):
+        return self.__sr
+
+    def load(self, path):
+        """
+        Loads an audio file at the recognizer rate.
+
+        Args:
+            path (str): A wav, mp3 or any other file librosa can decode.
+
+        Returns:
+            numpy.ndarray: The read-only mono float32 signal.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        key = hashlib.sha1(data).hexdigest() + f'_{self.__sr}'
+
+        y = self.__lookup(key)
+        if y is not None:
+            return y
+
+        y, sr = AudioIngest.__decode(path, data)
+        y = self.normalize(y, sr)
+        if self.__cache_dir is not None:
+            np.save(os.path.join(self.__cache_dir, key + '.npy'), y)
+        self.__store(key, y)
+        return y
+
+    def normalize(self, y, sr):
+        """
+        Brings an in-memory signal, such as a microphone recording, to the recognizer format.
+
+        Args:
+            y (numpy.ndarray): The signal, either mono or with shape (samples, channels).
+            sr (int): The rate of the signal.
+
+        Returns:
+            numpy.ndarray: The mono float32 signal at the recognizer rate.
+        """
+        y = np.asarray(y)
+        if np.issubdtype(y.dtype, np.integer):
+            y = y / float(np.iinfo(y.dtype).max + 1)
+        if y.ndim > 1:
+            y = y.mean(axis=1)
+        y = y.astype(np.float32)
+        if sr != self.__sr:
+            # librosa is slow to import and only needed for resampling
+            import librosa
+            y = librosa.resample(y, orig_sr=sr, target_sr=self.__sr).astype(np.float32)
+        return y
+
+    @staticmethod
+    def __decode(path, data):
+        """
+        Decodes file content into a (samples,) or (samples, channels) signal and its rate.
+        """
+        if path.lower().endswith('.mp3'):
+            # pydub is only needed for mp3 sources
+            from pydub import AudioSegment
+            sound = AudioSegment.from_file(io.BytesIO(data), format='mp3')
+            samples = np.array(sound.get_array_of_samples()).reshape(-1, sound.channels)
+            return samples / float(1 << (8 * sound.sample_width - 1)), sound.frame_rate
+        try:
+            return soundfile.read(io.BytesIO(data), dtype='float32')
+        except RuntimeError:
+            import librosa
+            return librosa.load(path, sr=None, mono=True)
+
+    def __lookup(self, key):
+        with self.__lock:
+            if key in self.__cache:
+                self.__cache.move_to_end(key)
+                self.hits += 1
+                return self.__cache[key]
+
+        if self.__cache_dir is not None:
+            file = os.path.join(self.__cache_dir, key + '.npy')
+            if os.path.exists(file):
+                y = np.load(file)
+                with self.__lock:
+                    self.hits += 1
+                self.__store(key, y)
+                return y
+
+        with self.__lock:
+            self.misses += 1
+        return None
+
+    def __store(self, key, y):
+        y.flags.writeable = False
+        with self.__lock:
+            if key in self.__cache:
+                return
+            self.__cache[key] = y
+            self.__size += y.nbytes
+            while self.__size > self.__budget and len(self.__cache) > 1:
+                _, evicted = self.__cache.popitem(last=False)
+                self.__size -= evicted.nbytes
+
+
+# The ingest shared by every loader of the application
+Default = AudioIngest()
+
+
+def load(path):
+    """
+    Loads an audio file at the recognizer rate through the shared ingest.
+    """
+    return Default.load(path)
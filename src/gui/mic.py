@@ -9,14 +9,19 @@ from PyQt5.QtCore import *
 
 
 class MicrophoneRecorder(object):
-    def __init__(self, rate=16000, chunk_size=1024):
+    def __init__(self, rate=16000, chunk_size=1024, device=None, p=None, temp_path='temp.wav'):
         self.rate = rate
         self.chunk_size = chunk_size
-        self.p = pyaudio.PyAudio()
+        self.device = device
+        self.temp_path = temp_path
+        # Recorders of several devices may share one PyAudio instance
+        self.__owns_p = p is None
+        self.p = pyaudio.PyAudio() if p is None else p
         self.stream = self.p.open(format=pyaudio.paInt16,
                                   channels=1,
                                   rate=self.rate,
                                   input=True,
+                                  input_device_index=device,
                                   frames_per_buffer=self.chunk_size,
                                   stream_callback=self.new_frame)
         self.lock = threading.Lock()
@@ -56,8 +61,23 @@ class MicrophoneRecorder(object):
         self.frames = []
         self.test = []
 
+    def take_recording(self):
+        """
+        Stops recording and returns what was recorded, without writing any file.
+
+        Returns:
+            numpy.ndarray: The float32 signal at the recorder rate.
+        """
+        with self.lock:
+            self.__enable_record = False
+            self.pause = False
+            frames, self.frames, self.test = self.frames, [], []
+        if not frames:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(frames).astype(np.float32) / 32768
+
     def __write_temp(self):
-        with wave.open('temp.wav', 'wb') as f:
+        with wave.open(self.temp_path, 'wb') as f:
             f.setnchannels(1)
             f.setsampwidth(self.p.get_sample_size(pyaudio.paInt16))
             f.setframerate(self.rate)
@@ -75,7 +95,8 @@ class MicrophoneRecorder(object):
         with self.lock:
             self.stop = True
         self.stream.close()
-        self.p.terminate()
+        if self.__owns_p:
+            self.p.terminate()
 
 
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -0,0 +1,165 @@
+import atexit
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pyaudio
+import ingest
+
+
+class PlaybackEngine:
+    """
+    Plays audio without blocking the caller, on a PyAudio callback stream.
+
+    The engine shares the ``pyaudio.PyAudio`` instance already opened by ``MicrophoneRecorder``.
+    Clips are decoded once into int16 buffers kept per file, queued, and fed to the output
+    stream chunk by chunk from PyAudio's own thread, so the Qt event loop and the live FFT keep
+    running while a clip plays. Decoding runs on a single background thread, in the order clips
+    were requested, and the stream starts once the first buffer is queued, so even a file that
+    is not cached yet returns to the caller at once.
+    """
+
+    def __init__(self, p, rate=ingest.SampleRate, chunk_size=1024, cached=32):
+        """
+        Args:
+            p (pyaudio.PyAudio): The open PyAudio instance.
+            rate (int): The output sample rate.
+            chunk_size (int): The frames written per callback.
+            cached (int): The number of decoded files kept.
+        """
+        self.p = p
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.__cached = cached
+        self.__buffers = collections.OrderedDict()
+        self.__queue = collections.deque()
+        self.__current = None
+        self.__position = 0
+        # Bumped by stop, so clips still being decoded for an earlier request are dropped
+        self.__generation = 0
+        self.__decoder = ThreadPoolExecutor(1)
+        self.stream = None
+        # Registered after the recorder's, so the stream closes before PyAudio terminates
+        atexit.register(self.close)
+
+    def __buffer(self, clip):
+        """
+        Returns the int16 bytes of a file path or of a float signal at the output rate.
+        """
+        if not isinstance(clip, str):
+            return (np.clip(np.asarray(clip, dtype=np.float32), -1, 1) * 32767).astype(np.int16).tobytes()
+        with self.lock:
+            if clip in self.__buffers:
+                self.__buffers.move_to_end(clip)
+                return self.__buffers[clip]
+        data = (np.clip(ingest.load(clip), -1, 1) * 32767).astype(np.int16).tobytes()
+        with self.lock:
+            self.__buffers[clip] = data
+            if len(self.__buffers) > self.__cached:
+                self.__buffers.popitem(last=False)
+        return data
+
+    def __open(self):
+        if self.stream is None:
+            self.stream = self.p.open(format=pyaudio.paInt16,
+                                      channels=1,
+                                      rate=self.rate,
+                                      output=True,
+                                      frames_per_buffer=self.chunk_size,
+                                      stream_callback=self.new_chunk)
+            self.stream.start_stream()
+
+    def new_chunk(self, data, frame_count, time_info, status):
+        """
+        Fills one output buffer from the queue, padding with silence when it runs out.
+        """
+        size = frame_count * 2
+        out = bytearray()
+        with self.lock:
+            while len(out) < size:
+                if self.__current is None:
+                    if not self.__queue:
+                        break
+                    self.__current = self.__queue.popleft()
+                    self.__position = 0
+                take = self.__current[self.__position:self.__position + size - len(out)]
+                out += take
+                self.__position += len(take)
+                if self.__position >= len(self.__current):
+                    self.__current = None
+        # The stream keeps running on silence, so a new clip starts without reopening it
+        out += bytes(size - len(out))
+        return bytes(out), pyaudio.paContinue
+
+    def __submit(self, clips, repeats=1):
+        """
+        Decodes clips on the decoding thread, then queues them and starts the stream.
+
+        Args:
+            clips (list): File paths, float signals or raw int16 bytes, queued in order.
+            repeats (int): The number of times the clips are queued.
+        """
+        with self.lock:
+            generation = self.__generation
+
+        def decode():
+            buffers = [c if isinstance(c, bytes) else self.__buffer(c) for c in clips]
+            with self.lock:
+                if generation != self.__generation:
+                    return
+                self.__queue.extend(buffers * repeats)
+            self.__open()
+
+        self.__decoder.submit(decode)
+
+    def enqueue(self, clip):
+        """
+        Adds a clip after the ones already queued.
+
+        Args:
+            clip (str or numpy.ndarray): A file path or a float signal at the output rate.
+        """
+        self.__submit([clip])
+
+    def play(self, clip):
+        """
+        Stops what is playing and plays a clip.
+        """
+        self.stop()
+        self.enqueue(clip)
+
+    def interleave(self, reference, test, gap=0.3, repeats=1):
+        """
+        Plays a reference and a test clip one after the other, separated by short silences.
+
+        Args:
+            reference (str or numpy.ndarray): The reference clip.
+            test (str or numpy.ndarray): The test clip.
+            gap (float): The silence between clips, in seconds.
+            repeats (int): The number of reference/test rounds.
+        """
+        self.stop()
+        silence = bytes(int(gap * self.rate) * 2)
+        self.__submit([reference, silence, test, silence], repeats)
+
+    def stop(self):
+        """
+        Drops the clip playing and everything queued.
+        """
+        with self.lock:
+            self.__generation += 1
+            self.__queue.clear()
+            self.__current = None
+
+    def is_playing(self):
+        with self.lock:
+            return self.__current is not None or bool(self.__queue)
+
+    def close(self):
+        self.stop()
+        self.__decoder.shutdown(wait=True)
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
@@ -7,6 +7,7 @@ from matplotlib.patches import ConnectionPatch
 from fastdtw import fastdtw
 from scipy.spatial.distance import euclidean
 import asyncio
+from dtw_view import DTWView
 
 class GenericMatPlot(Figure):
 
@@ -40,7 +41,8 @@ class Spectrogram(GenericMatPlot):
         super(Spectrogram, self).__init__(self.__fig, self.__ax, parent)
         self.__f = True
 
-    def makePlot(self, y1, y2, sr, hop_length):
+    def makePlot(self, y1, y2, sr, features):
+        hop_length = features.hop_length
         self.__ax[0].cla()
         self.__ax[1].cla()
         D = librosa.amplitude_to_db(np.abs(librosa.stft(y1)), ref=np.max)
@@ -69,20 +71,25 @@ class DTWGraph(GenericMatPlot):
         super(DTWGraph, self).__init__(self.__fig, self.__ax, parent)
         self.__f = True
 
-    def makePlot(self, x, y, sr, hop_length):
+    def makePlot(self, x, y, sr, features):
+        hop_length = features.hop_length
         self.__ax[0].cla()
         self.__ax[1].cla()
-        ref_mfcc = librosa.feature.mfcc(y=x, sr=sr, hop_length=hop_length)
-        test_mfcc = librosa.feature.mfcc(y=y, sr=sr, hop_length=hop_length)
-        D, wp = librosa.sequence.dtw(X=ref_mfcc, Y=test_mfcc, metric='euclidean')
+        ref_mfcc = features.mfcc(x, sr)
+        test_mfcc = features.mfcc(y, sr)
+        # Only a screen sized tile of the accumulated cost is kept, the path is exact
+        view = DTWView(ref_mfcc, test_mfcc)
+        wp = view.path()
 
         wps = librosa.frames_to_time(wp, sr=sr, hop_length=hop_length)
-        img = librosa.display.specshow(D, x_axis='time', y_axis='time', sr=sr, hop_length=hop_length, ax=self.__ax[0])
+        rows = librosa.frames_to_time(view.rows, sr=sr, hop_length=hop_length)
+        columns = librosa.frames_to_time(view.columns, sr=sr, hop_length=hop_length)
+        img = self.__ax[0].pcolormesh(columns, rows, view.tile, shading='nearest')
         self.__ax[0].plot(wps[:, 1], wps[:, 0], marker='.', color='r')
         if self.__f:
             self.__fig.colorbar(img, ax=self.__ax)
             self.__f = False
-        self.__ax[1].plot(D[-1, :] / wp.shape[0])
+        self.__ax[1].plot(view.last_row / wp.shape[0])
         self.__ax[0].set_title("Warping Paths")
         self.__ax[1].set_title("Cost")
         self.__ax[0].label_outer()
@@ -96,13 +103,14 @@ class RelationGraph(GenericMatPlot):
         self.__fig, self.__ax = plt.subplots(nrows=2, sharex=True, sharey=True, figsize=(8, 4))
         super(RelationGraph, self).__init__(self.__fig, self.__ax, parent)
 
-    def makePlot(self, x, y, sr, hop_length):
+    def makePlot(self, x, y, sr, features):
+        hop_length = features.hop_length
         self.__ax[0].cla()
         self.__ax[1].cla()
 
-        ref_mfcc = librosa.feature.mfcc(y=x, sr=sr, hop_length=hop_length)
-        test_mfcc = librosa.feature.mfcc(y=y, sr=sr, hop_length=hop_length)
-        D, wp = librosa.sequence.dtw(X=ref_mfcc, Y=test_mfcc, metric='euclidean')
+        ref_mfcc = features.mfcc(x, sr)
+        test_mfcc = features.mfcc(y, sr)
+        wp = DTWView(ref_mfcc, test_mfcc).path()
         wps = librosa.frames_to_time(wp, sr=sr, hop_length=hop_length)
         # Plot x_2
         librosa.display.waveshow(y, sr=sr, ax=self.__ax[1])
@@ -134,11 +142,12 @@ class FeatureGraph(GenericMatPlot):
         super(FeatureGraph, self).__init__(self.__fig, self.__ax, parent)
         self.__f = True
 
-    def makePlot(self, x, y, sr, hop_length):
+    def makePlot(self, x, y, sr, features):
+        hop_length = features.hop_length
         self.__ax[0].cla()
         self.__ax[1].cla()
-        ref_mfcc = librosa.feature.mfcc(y=x, sr=sr, hop_length=hop_length)
-        test_mfcc = librosa.feature.mfcc(y=y, sr=sr, hop_length=hop_length)
+        ref_mfcc = features.mfcc(x, sr)
+        test_mfcc = features.mfcc(y, sr)
 
         img = librosa.display.specshow(ref_mfcc, x_axis="time", y_axis="frames", hop_length=hop_length, ax=self.__ax[0])
         librosa.display.specshow(test_mfcc, x_axis="time", y_axis="frames", hop_length=hop_length, ax=self.__ax[1])
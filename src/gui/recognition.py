@@ -1,19 +1,18 @@
-import copy
+import time
 import numpy as np
-from glob import glob
-import librosa
-import scipy.spatial.distance
 from fastdtw import fastdtw
-from playsound import playsound
-import os.path as p
-from scipy.io import wavfile
-from scipy.spatial.distance import euclidean, cosine
-from pydub import AudioSegment
-import matplotlib.pyplot as plt
-import librosa.display
-from dtw import dtw
+import ingest
+from features import FeatureConfig, euclidean
 from testcase import Testcase
-import pandas as pd
+from compact import CompactTestcase
+from templates import TemplateSet
+from corpus_pack import CorpusPack
+import cascade
+import early_exit
+import embedding
+import subsequence
+from batch_dtw import batch_dtw
+from dtw_view import DTWView
 
 class WordRecognition:
     """
@@ -28,12 +27,28 @@ class WordRecognition:
         FemaleReference (str): Directory path for female voice references.
         MaleReference (str): Directory path for male voice references.
         SampleRate (int): The sample rate for audio processing (default is 16000 Hz).
+        Features (FeatureConfig): The feature pipeline every comparison uses. Set it before loading
+            references, or use ``fitFeatures`` which also drops the features already extracted.
+        DTWConfig (str): Identifies the DTW settings in distance cache keys.
+        DTWKernel (str): 'fastdtw' to align word pairs one at a time, 'batch' to align all the
+            pairs of ``decide_speech_pairs`` together with the exact ``batch_dtw`` kernel, or
+            'early' to align them incrementally and stop as soon as the decision is certain.
+            The fixed rejection threshold of 20 is tuned for fastdtw distances, so both exact
+            kernels reject against the per-word thresholds of ``calibrateThresholds`` instead.
+        BatchDTWConfig (str): Identifies the batch kernel settings in distance cache keys.
+        DistanceCache (DistanceCache): The cache of pairwise distances, or None to always align.
     """
     ChildReference = 'Segments\\CR'
     FemaleReference = 'Segments\\FR'
     MaleReference = 'Segments\\MR'
 
-    SampleRate = 16000
+    SampleRate = ingest.SampleRate
+    Features = FeatureConfig()
+
+    DTWConfig = 'fastdtw:radius=1:euclidean'
+    DTWKernel = 'fastdtw'
+    BatchDTWConfig = 'exact:euclidean'
+    DistanceCache = None
 
     def __init__(self):
         """
@@ -41,6 +56,12 @@ class WordRecognition:
         and child voices.
         """
         self.__initialize_refs()
+        self.__speaker_classifier = None
+        self.__min_confidence = 0.0
+        self.__cascade_stats = cascade.CascadeStats()
+        self.__embedding_indexes = {}
+        self.__thresholds = {}
+        self.__early_exit_stats = early_exit.EarlyExitStats()
 
     def __initialize_refs(self):
         """
@@ -53,18 +74,97 @@ class WordRecognition:
 
     def setReference(self, ref, type):
         """
-        Sets a custom reference directory for a specific gender category.
+        Sets a custom reference for a specific gender category.
 
         Args:
-            ref (str): Directory path containing reference samples.
+            ref (str, Testcase or TemplateSet): Directory path containing reference samples, a path
+                to a template file written by ``templates.py`` or to a corpus pack written by
+                ``corpus_pack.py``, or an already loaded reference set.
             type (str): The gender type ('M' for male, 'F' for female, 'C' for child).
         """
+        if isinstance(ref, str):
+            if ref.endswith(TemplateSet.Extension):
+                ref = TemplateSet(ref)
+            elif ref.endswith(CorpusPack.Extension):
+                ref = CorpusPack(ref).reference(speaker_type=type)
+            else:
+                ref = Testcase(ref)
+
+        # Stored features are only comparable when extracted by the same pipeline
+        key = ref.features_key() if hasattr(ref, 'features_key') else None
+        if key is not None and key != WordRecognition.Features.key():
+            raise ValueError(f'the reference features were extracted with feature config {key}, '
+                             f'not {WordRecognition.Features.key()}')
+
+        if hasattr(ref, 'add_listener'):
+            ref.add_listener(self.invalidateReferences)
+        self.invalidateReferences()
         if type == 'M':
-            self.__ref_males = Testcase(ref)
+            self.__ref_males = ref
         elif type == 'F':
-            self.__ref_females = Testcase(ref)
+            self.__ref_females = ref
         elif type == 'C':
-            self.__ref_children = Testcase(ref)
+            self.__ref_children = ref
+
+    def setSpeakerClassifier(self, classifier, min_confidence=0.9):
+        """
+        Sets a fast speaker classifier used by ``decide_gender`` before falling back to DTW.
+
+        Args:
+            classifier (SpeakerClassifier): A fitted classifier, or None to always use DTW.
+            min_confidence (float): The posterior probability below which DTW decides instead.
+        """
+        self.__speaker_classifier = classifier
+        self.__min_confidence = min_confidence
+
+    def fitFeatures(self, config):
+        """
+        Fits the projection of a feature pipeline on the current references and switches to it.
+
+        Features already extracted from the references are dropped, so they are extracted again
+        with the new pipeline on their next comparison. References storing their features, like
+        template sets, packs and compact test cases, cannot be extracted again: with any of them
+        loaded, the config must be the fitted pipeline they were built with, and it is switched
+        to without fitting it again.
+
+        Args:
+            config (FeatureConfig): The feature pipeline, fitted here when it has a projection.
+
+        Raises:
+            ValueError: If a reference stores features of another pipeline. This is checked
+                before anything is fitted, so the config is left untouched.
+        """
+        refs = [self.__ref_males, self.__ref_females, self.__ref_children]
+        stored = [ref.features_key() for ref in refs if hasattr(ref, 'features_key')]
+        for key in stored:
+            if not config.is_fitted() or (key is not None and key != config.key()):
+                raise ValueError(f'the reference features were extracted with feature config {key}, '
+                                 f'not {config.key()}; rebuild them with the new pipeline')
+
+        if not stored:
+            waveforms = []
+            labels = []
+            for ref in refs:
+                for i, sample in enumerate(ref.get_cases()):
+                    waveforms.append(sample['wav'])
+                    # Labelled by word, so LDA separates the two words of a pair
+                    labels.append(i)
+            config.fit(waveforms, labels, WordRecognition.SampleRate)
+
+        WordRecognition.Features = config
+        for ref in refs:
+            for sample in ref.get_cases():
+                if isinstance(sample, dict):
+                    sample.pop('mfcc', None)
+        self.invalidateReferences()
+
+    def invalidateReferences(self):
+        """
+        Drops everything built from the references: the embedding indexes and the calibrated
+        thresholds. They are built again on their next use.
+        """
+        self.__embedding_indexes = {}
+        self.__thresholds = {}
 
     def getReference(self, type, i):
         """
@@ -84,24 +184,225 @@ class WordRecognition:
         elif type == 'C':
             return self.__ref_children.get_case(i)
 
+    def getReferenceCases(self, type):
+        """
+        Retrieves all reference samples of a given gender.
+
+        Args:
+            type (str): The gender type ('M' for male, 'F' for female, 'C' for child).
+
+        Returns:
+            list: The reference samples.
+        """
+        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
+        return refs[type].get_cases()
+
+    def getReferenceSources(self):
+        """
+        Retrieves where the reference of every gender was loaded from.
+
+        Returns:
+            dict: The directory or file of every gender, or None for references without one.
+        """
+        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
+        return {g: ref.get_name() if hasattr(ref, 'get_name') else None for g, ref in refs.items()}
+
+    def buildEmbeddingIndex(self, pools=(), partitions=None):
+        """
+        Builds the per-gender embedding indexes used by ``decide_speech`` to retrieve candidates.
+
+        Every reference sample, and every sample of the extra pools, is embedded once and
+        labelled with its word pair, so candidate words are found with one matrix product.
+
+        Args:
+            pools (list): Extra ``Testcase`` objects added to the index of their speaker type.
+            partitions (int): The number of k-means partitions of every index, or None for
+                brute force search.
+        """
+        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
+        indexes = {}
+        for g, ref in refs.items():
+            cases = [ref] + [pool for pool in pools if pool.get_main_sample()['speaker type'] == g]
+            vectors = []
+            labels = []
+            for case in cases:
+                for i, sample in enumerate(case.get_cases()):
+                    if case is ref:
+                        features = WordRecognition.reference_features(sample)
+                    else:
+                        features = [WordRecognition.extract_features(sample['wav'])]
+                    for f in features:
+                        vectors.append(embedding.embed(f))
+                        labels.append(i // 2)
+            indexes[g] = embedding.EmbeddingIndex(np.array(vectors), np.array(labels), partitions)
+
+        # Swapped in one assignment so concurrent searches never see a partial index
+        self.__embedding_indexes = indexes
+
+    def calibrateThresholds(self, margin=0.5):
+        """
+        Calibrates the per-word rejection thresholds of the 'batch' and 'early' ``DTWKernel``.
+
+        Every word is compared with the words of its own reference set outside its pair and with
+        the same word of the other two sets, see ``early_exit.calibrate``.
+
+        Args:
+            margin (float): The position of the thresholds between genuine and impostor distances.
+        """
+        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
+        features = {g: [WordRecognition.reference_features(s) for s in ref.get_cases()] for g, ref in refs.items()}
+        self.__thresholds = {g: early_exit.calibrate(features[g], [features[h] for h in refs if h != g], margin)
+                             for g in refs}
+
+    def getThresholds(self, gender):
+        """
+        Returns:
+            list: The rejection threshold of every word of a gender, calibrated on first use.
+        """
+        if gender not in self.__thresholds:
+            self.calibrateThresholds()
+        return self.__thresholds[gender]
+
+    def getEarlyExitStats(self):
+        """
+        Returns:
+            EarlyExitStats: The work done by the early-exit decisions run so far.
+        """
+        return self.__early_exit_stats
+
+    def getCascadeStats(self):
+        """
+        Returns:
+            CascadeStats: The statistics of the cascaded searches run so far.
+        """
+        return self.__cascade_stats
+
+    @staticmethod
+    def extract_features(x):
+        """
+        Extracts the features used by every comparison with the ``Features`` pipeline.
+
+        Args:
+            x (numpy.ndarray): The audio data.
+
+        Returns:
+            numpy.ndarray: The features with shape (coefficients, frames).
+        """
+        return WordRecognition.Features.extract(x, WordRecognition.SampleRate)
+
     @staticmethod
-    def __remove_mfcc_mean(mfcc):
+    def compare_features(mfcc_1, mfcc_2):
         """
-        Removes the mean and normalizes the MFCC features for better comparison.
+        Compares two already extracted feature matrices using DTW.
+
+        When a ``DistanceCache`` is set, pairs already aligned are answered from the cache. Keys
+        include the DTW settings and the feature pipeline hash.
 
         Args:
-            mfcc (numpy.ndarray): The MFCC features to be processed.
+            mfcc_1 (numpy.ndarray): The features of the first sample.
+            mfcc_2 (numpy.ndarray): The features of the second sample.
 
         Returns:
-            numpy.ndarray: The processed MFCC features.
+            float: The DTW distance between the two feature matrices.
+        """
+        cache = WordRecognition.DistanceCache
+        if cache is not None:
+            key = cache.key(mfcc_1, mfcc_2, WordRecognition.DTWConfig + ':' + WordRecognition.Features.key())
+            dist = cache.get(key)
+            if dist is not None:
+                return dist
+
+        dist, w = fastdtw(mfcc_1.T, mfcc_2.T, dist=euclidean)
+        if cache is not None:
+            cache.put(key, dist)
+        return dist
+
+    @staticmethod
+    def compare_batch(pairs, threads=1):
         """
-        mfcc_copy = copy.deepcopy(mfcc)
-        number_of_vectors = mfcc.shape[1]
-        for i in range(number_of_vectors):
-            mfcc_copy[:, i] = mfcc[:, i] - np.mean(mfcc[:, i])
-            mfcc_copy[:, i] = mfcc_copy[:, i] / np.max(np.abs(mfcc_copy[:, i]))
+        Compares many (test, reference) feature pairs with the batched exact DTW kernel.
+
+        When a ``DistanceCache`` is set, only the pairs it does not hold are aligned.
+
+        Args:
+            pairs (list): The (test, reference) feature matrices.
+            threads (int): The number of threads aligning the batch.
 
-        return mfcc_copy
+        Returns:
+            numpy.ndarray: The DTW distance of every pair.
+        """
+        cache = WordRecognition.DistanceCache
+        if cache is None:
+            return batch_dtw(pairs, threads=threads)
+
+        config = WordRecognition.BatchDTWConfig + ':' + WordRecognition.Features.key()
+        keys = [cache.key(a, b, config) for a, b in pairs]
+        cached = [cache.get(key) for key in keys]
+        missing = [k for k, dist in enumerate(cached) if dist is None]
+        distances = np.array([np.nan if dist is None else dist for dist in cached])
+        if missing:
+            distances[missing] = batch_dtw([pairs[k] for k in missing], threads=threads)
+            for k in missing:
+                cache.put(keys[k], float(distances[k]))
+        return distances
+
+    @staticmethod
+    def reference_features(sample):
+        """
+        Returns the feature matrices a reference sample is compared against.
+
+        Samples loaded from audio have a single matrix extracted from their waveform, which is
+        kept in the sample so it is only extracted once, while samples of a ``TemplateSet``
+        carry one or more averaged templates.
+
+        Args:
+            sample (dict): The reference sample.
+
+        Returns:
+            list: The feature matrices of the sample.
+        """
+        if 'templates' in sample:
+            return sample['templates']
+        if 'mfcc' not in sample:
+            sample['mfcc'] = WordRecognition.extract_features(sample['wav'])
+        return [sample['mfcc']]
+
+    @staticmethod
+    def sample_features(sample):
+        """
+        Returns the features of a test sample, using stored features when the sample has them.
+
+        Args:
+            sample (dict or CompactSample): The test sample.
+
+        Returns:
+            numpy.ndarray: The features of the sample.
+
+        Raises:
+            ValueError: If the sample stores features of another pipeline.
+        """
+        if 'mfcc' in sample:
+            key = sample.owner.features_key() if hasattr(sample, 'owner') else None
+            if key is not None and key != WordRecognition.Features.key():
+                raise ValueError(f'the test features were extracted with feature config {key}, '
+                                 f'not {WordRecognition.Features.key()}')
+            return sample['mfcc']
+        return WordRecognition.extract_features(sample['wav'])
+
+    @staticmethod
+    def compare_reference(features, sample):
+        """
+        Compares test features against a reference sample, using the closest of its templates.
+
+        Args:
+            features (numpy.ndarray): The features of the test sample.
+            sample (dict): The reference sample.
+
+        Returns:
+            float: The smallest DTW distance between the test and the reference templates.
+        """
+        return min(WordRecognition.compare_features(features, t)
+                   for t in WordRecognition.reference_features(sample))
 
     @staticmethod
     def compare_sound(x, y):
@@ -115,23 +416,20 @@ class WordRecognition:
         Returns:
             float: The DTW distance between the two audio samples.
         """
-        # Extracting MFCC of the sound
-        mfcc_1 = librosa.feature.mfcc(y=x, sr=WordRecognition.SampleRate)
-        mfcc_2 = librosa.feature.mfcc(y=y, sr=WordRecognition.SampleRate)
-
-        # Removing Mean value
-        mfcc_1 = WordRecognition.__remove_mfcc_mean(mfcc_1)
-        mfcc_2 = WordRecognition.__remove_mfcc_mean(mfcc_2)
+        # Extracting MFCC of the sound and removing mean value
+        mfcc_1 = WordRecognition.extract_features(x)
+        mfcc_2 = WordRecognition.extract_features(y)
 
         # Applying DTW
-        dist, w = fastdtw(mfcc_1.T, mfcc_2.T, dist=euclidean)
-
-        return dist
+        return WordRecognition.compare_features(mfcc_1, mfcc_2)
 
     def decide_gender(self, test):
         """
         Determines the gender of the speaker in the test audio sample.
 
+        If a speaker classifier is set and confident enough, its decision is returned without
+        any alignment; otherwise the test is compared with the main sample of every reference.
+
         Args:
             test (str or Testcase): The file path or Testcase object containing the test audio.
 
@@ -139,56 +437,129 @@ class WordRecognition:
             tuple: A tuple containing the predicted gender ('M', 'F', or 'C') 
                    and the corresponding reference audio sample.
         """
-        if type(test) is Testcase:
+        features = None
+        if isinstance(test, (Testcase, CompactTestcase)):
             test_sample = test.get_main_sample()
-            test = test_sample['wav']
+            features = WordRecognition.sample_features(test_sample)
+            test = test_sample['wav'] if self.__speaker_classifier is not None else None
+
+        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
+        if self.__speaker_classifier is not None:
+            g, confidence = self.__speaker_classifier.predict(test, WordRecognition.SampleRate)
+            if confidence >= self.__min_confidence:
+                return g, refs[g].get_main_sample()['wav']
 
-        male_ref = self.__ref_males.get_main_sample()['wav']
-        female_ref = self.__ref_females.get_main_sample()['wav']
-        child_ref = self.__ref_children.get_main_sample()['wav']
+        male_ref = self.__ref_males.get_main_sample()
+        female_ref = self.__ref_females.get_main_sample()
+        child_ref = self.__ref_children.get_main_sample()
 
         types = ['M', 'F', 'C']
-        m_d = WordRecognition.compare_sound(test, male_ref)
-        f_d = WordRecognition.compare_sound(test, female_ref)
-        c_d = WordRecognition.compare_sound(test, child_ref)
+        if features is None:
+            features = WordRecognition.extract_features(test)
+        m_d = WordRecognition.compare_reference(features, male_ref)
+        f_d = WordRecognition.compare_reference(features, female_ref)
+        c_d = WordRecognition.compare_reference(features, child_ref)
         dist_list = [m_d, f_d, c_d]
-        ref_list = [male_ref, female_ref, child_ref]
+        ref_list = [male_ref['wav'], female_ref['wav'], child_ref['wav']]
         min_index = dist_list.index(min(dist_list))
 
         return types[min_index], ref_list[min_index]
 
-    def decide_speech(self, test, gender, index):
+    def decide_speech(self, test, gender, index, shortlist=None, candidates=None):
         """
         Determines the correct speech for the test audio sample, based on the gender.
 
+        With a ``candidates`` count only the words returned by the embedding index (see
+        ``buildEmbeddingIndex``) are searched. With a ``shortlist`` size the search is cascaded:
+        every candidate is first scored with DTW on pooled, truncated features and only the best
+        ``shortlist`` candidates are aligned at full resolution. The cost and recall are
+        accumulated in ``getCascadeStats``.
+
         Args:
             test (str or Testcase): The file path or Testcase object containing the test audio.
             gender (str): The gender of the speaker ('M', 'F', or 'C').
             index (int): The index of the reference case to compare with.
+            shortlist (int): The number of candidates aligned at full resolution, or None to
+                align all of them.
+            candidates (int): The number of words retrieved from the embedding index, or None to
+                search every word.
 
         Returns:
             dict: The correct reference speech sample if a match is found.
         """
-        c_test = copy.copy(test)
-        if type(test) is Testcase:
-            test_sample = test.get_case(index)
-            c_test = test_sample['wav']
-
-        cost_list = []
+        if isinstance(test, (Testcase, CompactTestcase)):
+            features = WordRecognition.sample_features(test.get_case(index))
+        else:
+            features = WordRecognition.extract_features(test)
 
         refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
         ref_cases = refs[gender].get_cases()
         size = len(ref_cases)
-        for i in range(0, size, 2):
-            ref = ref_cases[i]
-            ref_wav = ref['wav']
-            cost = WordRecognition.compare_sound(c_test, ref_wav)
-            cost_list.append(cost)
+        references = [WordRecognition.reference_features(ref_cases[i]) for i in range(0, size, 2)]
+
+        searched = list(range(len(references)))
+        if candidates is not None:
+            if gender not in self.__embedding_indexes:
+                self.buildEmbeddingIndex()
+            searched = self.__embedding_indexes[gender].search(embedding.embed(features), candidates)
+
+        coarse_time = 0.0
+        if shortlist is not None:
+            start = time.perf_counter()
+            ranked = cascade.shortlist(features, [references[i] for i in searched], shortlist)
+            searched = [searched[i] for i in ranked]
+            coarse_time = time.perf_counter() - start
 
-        minimum_point = cost_list.index(min(cost_list))
+        start = time.perf_counter()
+        cost_list = [min(WordRecognition.compare_features(features, r) for r in references[i]) for i in searched]
+        full_time = time.perf_counter() - start
+
+        if shortlist is not None:
+            self.__cascade_stats.add(len(references), searched, index // 2, coarse_time, full_time)
+
+        minimum_point = searched[cost_list.index(min(cost_list))]
         right = refs[gender].get_case(minimum_point * 2)
         return right
 
+    def spot_keywords(self, recording, gender, threshold=None):
+        """
+        Finds the reference words spoken in a continuous recording.
+
+        Every reference template is aligned with the whole recording by subsequence DTW, which
+        finds the best start and end of the word for every position in a single pass. Where
+        detections of several words overlap, the one with the lowest length-normalized cost wins.
+
+        Args:
+            recording (numpy.ndarray): The audio data of the continuous recording.
+            gender (str): The gender of the speaker ('M', 'F', or 'C').
+            threshold (float): The highest normalized cost of a detection, or None to keep the
+                best non-overlapping detections everywhere.
+
+        Returns:
+            list: The detections ordered by time, each a dict with the reference ``index``, the
+            ``word``, its ``start`` and ``end`` in seconds and its normalized ``cost``.
+        """
+        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
+        features = WordRecognition.extract_features(recording)
+        hits = []
+        for i, sample in enumerate(refs[gender].get_cases()):
+            for template in WordRecognition.reference_features(sample):
+                costs, starts, steps = subsequence.subsequence_dtw(template, features)
+                for start, end, cost in subsequence.find_matches(costs, starts, steps, threshold):
+                    hits.append((cost, i, start, end))
+
+        seconds = WordRecognition.Features.frame_step / WordRecognition.SampleRate
+        taken = np.zeros(features.shape[1], dtype=bool)
+        detections = []
+        for cost, i, start, end in sorted(hits):
+            if taken[start:end + 1].any():
+                continue
+            taken[start:end + 1] = True
+            detections.append({'index': i, 'word': WordsList[i], 'start': start * seconds,
+                               'end': (end + 1) * seconds, 'cost': cost})
+
+        return sorted(detections, key=lambda d: d['start'])
+
     def decide_speech_pair(self, test, gender, index):
         """
         Compares the test audio sample with a pair of reference speech samples to identify the correct one.
@@ -201,30 +572,178 @@ class WordRecognition:
         Returns:
             int: 1 if the first reference is closer, 0 if the second is closer, or -1 if the match is poor.
         """
-        c_test = copy.copy(test)
-        if type(test) is Testcase:
-            test_sample = test.get_case(index)
-            c_test = test_sample['wav']
+        return self.decide_speech_pairs(test, gender, [index])[0]
 
-        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
-        r_1 = refs[gender].get_case(index)['wav']
+    @staticmethod
+    def partner(index):
+        """
+        Returns:
+            int: The index of the other word of the pair of word ``index``.
+        """
         if index == 0:
-            index_2 = 1
+            return 1
+        return index + (-1 if index % 2 else (1))
+
+    def decide_speech_pairs(self, test, gender, indices, threads=1):
+        """
+        Runs ``decide_speech_pair`` for several words of the same test.
+
+        With the 'batch' ``DTWKernel`` every alignment of every word is computed in one call to
+        the batched kernel instead of one ``fastdtw`` call per template. With the 'early' kernel
+        every word stops aligning once lower bounds on the remaining cost show the decision can
+        no longer change, and the work saved is accumulated in ``getEarlyExitStats``.
+
+        Args:
+            test (str or Testcase): The Testcase object, or a single recording when ``indices``
+                has one word.
+            gender (str): The gender of the speaker ('M', 'F', or 'C').
+            indices (list): The indices of the words.
+            threads (int): The number of threads aligning the batch.
+
+        Returns:
+            list: The decision for every word, as returned by ``decide_speech_pair``.
+        """
+        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
+        jobs = []
+        for index in indices:
+            if isinstance(test, (Testcase, CompactTestcase)):
+                features = WordRecognition.sample_features(test.get_case(index))
+            else:
+                features = WordRecognition.extract_features(test)
+            r_1 = WordRecognition.reference_features(refs[gender].get_case(index))
+            r_2 = WordRecognition.reference_features(refs[gender].get_case(WordRecognition.partner(index)))
+            jobs.append((features, r_1, r_2))
+
+        if WordRecognition.DTWKernel == 'early':
+            decisions = []
+            for index, (features, r_1, r_2) in zip(indices, jobs):
+                limits = self.__limits(gender, index)
+                decision, cells, total = early_exit.decide_pair(features, r_1, r_2, limits)
+                self.__early_exit_stats.add(cells, total)
+                decisions.append(decision)
+            return decisions
+
+        if WordRecognition.DTWKernel == 'batch':
+            pairs = [(features, t) for features, r_1, r_2 in jobs for t in [*r_1, *r_2]]
+            flat = iter(WordRecognition.compare_batch(pairs, threads))
+            dists = [[min(next(flat) for _ in r_1), min(next(flat) for _ in r_2)] for _, r_1, r_2 in jobs]
         else:
-            index_2 = index + (-1 if index % 2 else (1))
-        r_2 = refs[gender].get_case(index_2)['wav']
+            dists = [[min(WordRecognition.compare_features(features, t) for t in r_1),
+                      min(WordRecognition.compare_features(features, t) for t in r_2)]
+                     for features, r_1, r_2 in jobs]
+
+        decisions = []
+        for index, d in zip(indices, dists):
+            limits = self.__limits(gender, index)
+            right = d.index(min(d))
+            if min(d) > limits[right]:
+                decisions.append(-1)
+            else:
+                decisions.append(([1, 0])[right])
+        return decisions
+
+    def __limits(self, gender, index):
+        """
+        Returns the rejection thresholds of a word and of its partner for the current kernel.
+        """
+        if WordRecognition.DTWKernel == 'fastdtw':
+            return 20, 20
+        thresholds = self.getThresholds(gender)
+        return thresholds[index], thresholds[WordRecognition.partner(index)]
+
+    def recognize(self, test, index=None, gender=None, paths=False):
+        """
+        Decides the speaker type and the word of one utterance in a single pass.
+
+        The test features are extracted once and aligned with every reference they are scored
+        against in one batch: the main sample of every reference set when ``index`` is None,
+        otherwise both words of the pair in every set, the speaker type being the set holding
+        the closest of them. A confident speaker classifier, or a given ``gender``, restricts the
+        batch to one set. With the 'fastdtw' ``DTWKernel`` the pairs are aligned one at a time;
+        with the 'batch' and 'early' kernels by ``compare_batch``, rejecting against the per-word
+        thresholds of ``calibrateThresholds``.
 
-        d_1 = WordRecognition.compare_sound(c_test, r_1)
-        d_2 = WordRecognition.compare_sound(c_test, r_2)
-        dists = [d_1, d_2]
+        Args:
+            test (str, numpy.ndarray or Testcase): The path or audio data of the recording, or a
+                Testcase whose main sample, or word ``index``, is recognized.
+            index (int): The index of the expected word, or None to only decide the speaker type.
+            gender (str): The known speaker type ('M', 'F', or 'C'), or None to decide it.
+            paths (bool): Whether to backtrack the warping paths of the chosen references.
 
-        print("Indcies", index, index_2)
+        Returns:
+            dict: The 'gender', the word 'decision' as returned by ``decide_speech_pair`` (None
+            without an ``index``), the chosen 'reference' sample, the 'distances' of every scored
+            set by target ('main', or 'word' and 'partner'), the 'paths' by target and the
+            'timings' in seconds of every stage.
+        """
+        started = time.perf_counter()
+        if isinstance(test, str):
+            test = ingest.load(test)
+        if isinstance(test, (Testcase, CompactTestcase)):
+            sample = test.get_main_sample() if index is None else test.get_case(index)
+            features = WordRecognition.sample_features(sample)
+            signal = sample['wav'] if self.__speaker_classifier is not None else None
+        else:
+            signal = test
+            features = WordRecognition.extract_features(test)
+        timings = {'features': time.perf_counter() - started}
 
-        right = dists.index(min(dists))
-        if min(dists) > 20:
-            return -1
+        refs = {'M': self.__ref_males, 'F': self.__ref_females, 'C': self.__ref_children}
+        if gender is None and self.__speaker_classifier is not None:
+            g, confidence = self.__speaker_classifier.predict(signal, WordRecognition.SampleRate)
+            if confidence >= self.__min_confidence:
+                gender = g
+        genders = ['M', 'F', 'C'] if gender is None else [gender]
+
+        jobs = []
+        for g in genders:
+            if index is None:
+                targets = {'main': refs[g].get_main_sample()}
+            else:
+                targets = {'word': refs[g].get_case(index), 'partner': refs[g].get_case(WordRecognition.partner(index))}
+            for target, sample in targets.items():
+                jobs += [(g, target, sample, t) for t in WordRecognition.reference_features(sample)]
+
+        start = time.perf_counter()
+        pairs = [(features, t) for _, _, _, t in jobs]
+        if WordRecognition.DTWKernel == 'fastdtw':
+            aligned = [WordRecognition.compare_features(a, b) for a, b in pairs]
         else:
-            return ([1, 0])[right]
+            aligned = WordRecognition.compare_batch(pairs)
+        timings['alignment'] = time.perf_counter() - start
+
+        distances = {g: {} for g in genders}
+        closest = {}
+        for (g, target, sample, t), d in zip(jobs, aligned):
+            if d < distances[g].get(target, np.inf):
+                distances[g][target] = float(d)
+                closest[g, target] = (sample, t)
+        if gender is None:
+            gender = min(genders, key=lambda g: min(distances[g].values()))
+
+        decision = None
+        if index is not None:
+            d = [distances[gender]['word'], distances[gender]['partner']]
+            limits = self.__limits(gender, index)
+            right = d.index(min(d))
+            decision = -1 if d[right] > limits[right] else ([1, 0])[right]
+
+        warping = {}
+        if paths:
+            start = time.perf_counter()
+            warping = {target: DTWView(features, t).path()
+                       for (g, target), (_, t) in closest.items() if g == gender}
+            timings['paths'] = time.perf_counter() - start
+        timings['total'] = time.perf_counter() - started
+
+        return {
+            'gender': gender,
+            'decision': decision,
+            'reference': closest[gender, 'main' if index is None else 'word'][0],
+            'distances': distances,
+            'paths': warping,
+            'timings': timings,
+        }
 
 
 WordsList = [
@@ -278,132 +797,6 @@ WordsList = [
 ]
 
 if __name__ == '__main__':
-    wr = WordRecognition()
-    files = glob('Testcases/*')
-    tests = []
-    r = 0
-    w = 0
-    o = 0
-    for file in files:
-        t = Testcase(file + '\\Segments')
-        tests.append(t)
-
-    print('\n\n\n\n------------------------------------------------\n\n\n')
-
-    pair        = []
-    WordIndex   = []
-    word        = []
-    total       = {'M': [], 'F': [], 'C': []}
-    other       = {'M': [], 'F': [], 'C': []}
-    word_2      = {'M': [], 'F': [], 'C': []}
-    word_1      = {'M': [], 'F': [], 'C': []}
-    correct     = {'M': [], 'F': [], 'C': []}
-    wrong       = {'M': [], 'F': [], 'C': []}
-
-    for x in range(45):
-        pair.append(int(x + 2)//2)
-        currentWord = (x + 2)%2 +1
-        WordIndex.append(currentWord)
-        word.append(WordsList[x])
-        r_g = {'M': 0, 'F': 0, 'C': 0}
-        w_g = {'M': 0, 'F': 0, 'C': 0}
-        o_g = {'M': 0, 'F': 0, 'C': 0}
-        a_g = {'M': 0, 'F': 0, 'C': 0}
-        for test in tests:
-            test_main_sample = test.get_case(x)
-            g = test_main_sample['speaker type']
-            m = wr.decide_speech_pair(test, g, x)
-
-            if m == 1:
-                r += 1
-                r_g[g] += 1
-            else:
-                if m == 0:
-                    w += 1
-                    w_g[g] += 1
-                    print(f"Wrong Case [{test_main_sample['name']}  {g}  =>{test_main_sample['speaker type']}]")
-                elif m == -1:
-                    o += 1
-                    o_g[g] += 1
-                    print(f"Others Case [{test_main_sample['name']}  {g}  =>{test_main_sample['speaker type']}]")
-
-        a = float(r) / (r + w + o)
-        a_g['M'] = float(r_g['M']) / (r_g['M'] + w_g['M'] + o_g['M'])
-        a_g['F'] = float(r_g['F']) / (r_g['F'] + w_g['F'] + o_g['F'])
-        a_g['C'] = float(r_g['C']) / (r_g['C'] + w_g['C'] + o_g['C'])
-
-        total['M'].append(r_g['M'] + w_g['M'] + o_g['M'])
-        total['F'].append(r_g['F'] + w_g['F'] + o_g['F'])
-        total['C'].append(r_g['C'] + w_g['C'] + o_g['C'])
-
-        other['M'].append(o_g['M'])
-        other['F'].append(o_g['F'])
-        other['C'].append(o_g['C'])
-
-        correct['M'].append(r_g['M'])
-        correct['F'].append(r_g['F'])
-        correct['C'].append(r_g['C'])
-
-        wrong['M'].append(w_g['M'] + o_g['M'])
-        wrong['F'].append(w_g['F'] + o_g['F'])
-        wrong['C'].append(w_g['C'] + o_g['C'])
-
-        if currentWord == 1:
-
-            word_2['M'].append(w_g['M'])
-            word_2['F'].append(w_g['F'])
-            word_2['C'].append(w_g['C'])
-            word_1['M'].append(r_g['M'])
-            word_1['F'].append(r_g['F'])
-            word_1['C'].append(r_g['C'])
-
-        else:
-
-            word_1['M'].append(w_g['M'])
-            word_1['F'].append(w_g['F'])
-            word_1['C'].append(w_g['C'])
-            word_2['M'].append(r_g['M'])
-            word_2['F'].append(r_g['F'])
-            word_2['C'].append(r_g['C'])
-
-    males = {
-        'Pair' : pair,
-        'pair number' : WordIndex,
-        'Word' : word,
-        'Males' : total['M'],
-        'others' : other['M'],
-        'word 2' : word_2['M'],
-        'word 1' : word_1['M'],
-        'correct' : correct['M'],
-        'wrong' : wrong['M']
-    }
-    females = {
-        'Pair' : pair,
-        'pair number' : WordIndex,
-        'Word' : word,
-        'Females' : total['F'],
-        'others' : other['F'],
-        'word 2' : word_2['F'],
-        'word 1' : word_1['F'],
-        'correct' : correct['F'],
-        'wrong' : wrong['F']
-    }
-    children = {
-        'Pair' : pair,
-        'pair number' : WordIndex,
-        'Word' : word,
-        'Children' : total['C'],
-        'others' : other['C'],
-        'word 2' : word_2['C'],
-        'word 1' : word_1['C'],
-        'correct' : correct['C'],
-        'wrong' : wrong['C']
-    }
-
-    m= pd.DataFrame(males)
-    f = pd.DataFrame(females)
-    c = pd.DataFrame(children)
-
-    m.to_csv('males.csv' , index=False , encoding='utf-8-sig')
-    f.to_csv('females.csv', index=False, encoding='utf-8-sig')
-    c.to_csv('children.csv', index=False, encoding='utf-8-sig')
\ No newline at end of file
+    # The evaluation sweep streams its results, see evaluation.py
+    import evaluation
+    evaluation.main()
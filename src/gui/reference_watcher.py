@@ -0,0 +1,145 @@
+import glob
+import os
+import threading
+import ingest
+from testcase import Testcase
+
+
+class WatchedReference:
+    """
+    A reference set that follows its directory and only reloads the files that changed.
+
+    It has the accessors of ``Testcase``. Every ``refresh`` compares the modification time and
+    size of the wav files with the last scan, decodes only the added or changed ones and swaps in
+    the new sample list with a single assignment, so recognition running on another thread
+    always sees either the previous or the updated set. Unchanged samples are kept as they are,
+    together with any features already extracted for them. Listeners are called after every
+    refresh that changed the set, so a recognizer can drop what it built from the old samples.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self.__lock = threading.Lock()
+        self.__stamps = {}
+        self.__samples = {}
+        self.__testcases = []
+        self.__thread = None
+        self.__interval = None
+        self.__stop = threading.Event()
+        self.__listeners = []
+        if not os.path.exists(self.__name + '\\Wav'):
+            # Testcase converts the mp3 files on construction
+            Testcase(self.__name)
+        self.refresh()
+
+    def __getstate__(self):
+        """
+        Drops the lock and the polling thread, which cannot be pickled, for snapshots.
+        """
+        state = self.__dict__.copy()
+        for name in ('lock', 'thread', 'stop'):
+            del state[f'_WatchedReference__{name}']
+        return state
+
+    def __setstate__(self, state):
+        """
+        Recreates the lock and restarts polling when the pickled set was polling.
+        """
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__stop = threading.Event()
+        if self.__interval is not None:
+            self.start(self.__interval)
+
+    def get_name(self):
+        return self.__name
+
+    def get_files(self):
+        return sorted(self.__samples)
+
+    def get_cases(self):
+        return self.__testcases
+
+    def get_case(self, i):
+        return self.__testcases[i]
+
+    def get_main_sample(self):
+        return self.__testcases[46]
+
+    def add_listener(self, callback):
+        """
+        Calls ``callback()`` after every refresh that added, changed or removed files.
+        """
+        self.__listeners.append(callback)
+
+    def refresh(self):
+        """
+        Rescans the directory and reloads the added or changed files.
+
+        Files that cannot be decoded yet, for example while they are still being written, keep
+        their previous sample and are retried on the next refresh.
+
+        Returns:
+            tuple: The lists of added, changed and removed file paths.
+        """
+        with self.__lock:
+            files = sorted(glob.glob(self.__name + '\\Wav\\*.wav'))
+            added, changed = [], []
+            stamps = {}
+            samples = {}
+            for file in files:
+                try:
+                    stat = os.stat(file)
+                except OSError:
+                    continue
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                if self.__stamps.get(file) == stamp:
+                    stamps[file] = stamp
+                    samples[file] = self.__samples[file]
+                    continue
+
+                try:
+                    sample = Testcase.extract_information(os.path.basename(os.path.normpath(file)))
+                    t = ingest.load(file)
+                except Exception:
+                    if file in self.__samples:
+                        stamps[file] = self.__stamps[file]
+                        samples[file] = self.__samples[file]
+                    continue
+                sample['wav'] = t
+                stamps[file] = stamp
+                samples[file] = sample
+                (changed if file in self.__samples else added).append(file)
+
+            removed = [file for file in self.__samples if file not in samples]
+            self.__stamps = stamps
+            self.__samples = samples
+            self.__testcases = [samples[file] for file in sorted(samples)]
+
+        if added or changed or removed:
+            for callback in self.__listeners:
+                callback()
+        return added, changed, removed
+
+    def start(self, interval=2.0):
+        """
+        Refreshes the set from a background thread every ``interval`` seconds.
+        """
+        if self.__thread is not None:
+            return
+        self.__interval = interval
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__poll, args=(interval,), daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__stop.set()
+            self.__thread.join()
+            self.__thread = None
+        self.__interval = None
+
+    def __poll(self, interval):
+        while not self.__stop.wait(interval):
+            self.refresh()
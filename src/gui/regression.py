@@ -0,0 +1,265 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import soundfile
+import ingest
+from recognition import WordRecognition, WordsList
+from segmentation import word_name
+from testcase import Testcase
+
+Version = 1
+
+# Pitch and formant scale of every synthetic speaker type
+Speakers = {'M': (120.0, 1.0), 'F': (210.0, 1.15), 'C': (290.0, 1.3)}
+
+Stages = ['ingest', 'features', 'gender', 'pair']
+
+Golden = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regression.json')
+
+
+def synthesize(index, speaker_type, student=1, sr=ingest.SampleRate):
+    """
+    Synthesizes a deterministic vowel-like word.
+
+    The formant trajectory and length are drawn from ``index`` alone, so every speaker says the
+    same word, while the speaker type sets the pitch and vocal tract scale and the student adds
+    small variations of both.
+
+    Args:
+        index (int): The position of the word in ``WordsList``.
+        speaker_type (str): 'M', 'F' or 'C'.
+        student (int): The speaker, for variations within a speaker type.
+        sr (int): The sample rate.
+
+    Returns:
+        numpy.ndarray: The float32 signal.
+    """
+    pitch, scale = Speakers[speaker_type]
+    word = np.random.default_rng(index)
+    speaker = np.random.default_rng([index, student, ord(speaker_type)])
+    start = word.uniform([250, 900, 2200], [850, 2200, 3000])
+    end = word.uniform([250, 900, 2200], [850, 2200, 3000])
+    duration = (0.3 + 0.3 * word.random()) * (1 + 0.04 * speaker.standard_normal())
+    pitch *= 1 + 0.03 * (student - 1)
+    scale *= 1 + 0.02 * (student - 1)
+
+    n = int(duration * sr)
+    progress = np.linspace(0, 1, n)
+    f0 = pitch * (1.05 - 0.1 * progress)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    formants = scale * (start[:, None] + (end - start)[:, None] * progress[None, :])
+
+    y = np.zeros(n)
+    for k in range(1, int(sr / 2 / pitch)):
+        gain = np.exp(-((k * f0[None, :] - formants) / 120.0) ** 2).sum(axis=0)
+        y += gain * np.sin(k * phase)
+    y *= np.sin(np.pi * progress) ** 0.5
+    y += 0.005 * speaker.standard_normal(n)
+    return (0.5 * y / np.abs(y).max()).astype(np.float32)
+
+
+def build_corpus(root):
+    """
+    Writes the mini corpus: a reference and a test ``Testcase`` directory per speaker type.
+
+    Args:
+        root (str): The directory receiving the corpus.
+
+    Returns:
+        tuple: The reference directories by speaker type and the test directories.
+    """
+    references = {}
+    tests = []
+    for speaker_type in Speakers:
+        for student in (1, 2):
+            info = {'group': 1, 'student_number': student, 'speaker type': speaker_type, 'speaker age': 20}
+            directory = os.path.join(root, f'G01S{student}{speaker_type}20')
+            os.makedirs(directory + '\\Wav', exist_ok=True)
+            for index in range(len(WordsList)):
+                file = directory + '\\Wav\\' + word_name(info, index) + '.wav'
+                soundfile.write(file, synthesize(index, speaker_type, student), ingest.SampleRate, subtype='PCM_16')
+            if student == 1:
+                references[speaker_type] = directory
+            else:
+                tests.append(directory)
+    return references, tests
+
+
+def run_pipeline(references, tests, words=45):
+    """
+    Runs ingest, feature extraction and both decisions over the mini corpus.
+
+    Args:
+        references (dict): The reference directory of every speaker type.
+        tests (list): The test directories.
+        words (int): The number of words decided per test.
+
+    Returns:
+        tuple: The decisions of every test and the seconds spent in every stage.
+    """
+    timings = dict.fromkeys(Stages, 0.0)
+    # A fresh ingest, so every run decodes the files instead of hitting the content cache
+    default = ingest.Default
+    ingest.Default = ingest.AudioIngest()
+    saved = (WordRecognition.MaleReference, WordRecognition.FemaleReference, WordRecognition.ChildReference)
+    start = time.perf_counter()
+    WordRecognition.MaleReference = references['M']
+    WordRecognition.FemaleReference = references['F']
+    WordRecognition.ChildReference = references['C']
+    try:
+        wr = WordRecognition()
+        cases = [Testcase(directory) for directory in tests]
+    finally:
+        WordRecognition.MaleReference, WordRecognition.FemaleReference, WordRecognition.ChildReference = saved
+        ingest.Default = default
+    timings['ingest'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for g in ('M', 'F', 'C'):
+        for sample in wr.getReferenceCases(g):
+            WordRecognition.reference_features(sample)
+    for test in cases:
+        for sample in test.get_cases():
+            sample['mfcc'] = WordRecognition.extract_features(sample['wav'])
+    timings['features'] = time.perf_counter() - start
+
+    decisions = {}
+    for directory, test in zip(tests, cases):
+        start = time.perf_counter()
+        gender = wr.decide_gender(test)[0]
+        timings['gender'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        pairs = [int(wr.decide_speech_pair(test, gender, x)) for x in range(words)]
+        timings['pair'] += time.perf_counter() - start
+        decisions[os.path.basename(directory)] = {'gender': gender, 'pairs': pairs}
+    return decisions, timings
+
+
+def measure(repeats=3, words=45, corpus=None):
+    """
+    Builds the mini corpus and runs the pipeline over it.
+
+    Decisions must not change between repeats; the timing of every stage is the fastest repeat.
+
+    Args:
+        repeats (int): The number of pipeline runs.
+        words (int): The number of words decided per test.
+        corpus (str): The directory to keep the corpus in, or None for a temporary one.
+
+    Returns:
+        dict: The results, in the format of the golden file.
+    """
+    root = corpus or tempfile.mkdtemp(prefix='regression')
+    try:
+        references, tests = build_corpus(root)
+        # The first extraction compiles librosa's kernels, which no stage should be charged for
+        WordRecognition.extract_features(synthesize(0, 'M'))
+        runs = [run_pipeline(references, tests, words) for _ in range(repeats)]
+    finally:
+        if corpus is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    decisions = runs[0][0]
+    if any(d != decisions for d, _ in runs[1:]):
+        raise RuntimeError('the decisions changed between repeats')
+    return {
+        'version': Version,
+        'features': WordRecognition.Features.key(),
+        'dtw': WordRecognition.DTWConfig if WordRecognition.DTWKernel == 'fastdtw' else WordRecognition.BatchDTWConfig,
+        'words': words,
+        'decisions': decisions,
+        'timings': {stage: min(t[stage] for _, t in runs) for stage in Stages},
+    }
+
+
+def compare(results, golden, tolerance=0.5, slack=0.05):
+    """
+    Compares results with the golden results.
+
+    Args:
+        results (dict): The results of ``measure``.
+        golden (dict): The stored golden results.
+        tolerance (float): The relative slowdown allowed for every stage.
+        slack (float): The absolute slowdown allowed for every stage, in seconds, so stages
+            taking a few milliseconds do not fail on noise.
+
+    Returns:
+        tuple: The report lines and whether the results pass.
+    """
+    lines = []
+    passed = True
+    for field in ('features', 'dtw', 'words'):
+        status = 'ok' if results[field] == golden.get(field) else 'CHANGED'
+        passed &= status == 'ok'
+        lines.append(f'setting {field:<8} {results[field]} golden {golden.get(field)} {status}')
+
+    golden_decisions = golden.get('decisions', {})
+    for name in sorted(set(results['decisions']) | set(golden_decisions)):
+        current = results['decisions'].get(name, {'gender': None, 'pairs': []})
+        expected = golden_decisions.get(name, {'gender': None, 'pairs': []})
+        status = 'ok' if current['gender'] == expected['gender'] else 'CHANGED'
+        passed &= status == 'ok'
+        lines.append(f'decision {name} gender {current["gender"]} golden {expected["gender"]} {status}')
+        for x in range(max(len(current['pairs']), len(expected['pairs']))):
+            now = current['pairs'][x] if x < len(current['pairs']) else None
+            then = expected['pairs'][x] if x < len(expected['pairs']) else None
+            status = 'ok' if now == then else 'CHANGED'
+            passed &= status == 'ok'
+            lines.append(f'decision {name} pair {x:02d} {now} golden {then} {status}')
+
+    for stage in Stages:
+        now = results['timings'][stage]
+        then = golden.get('timings', {}).get(stage)
+        if then is None:
+            lines.append(f'timing {stage:<8} {now:.3f}s no baseline')
+            continue
+        status = 'ok' if now <= then * (1 + tolerance) + slack else 'SLOWER'
+        passed &= status == 'ok'
+        change = (now / then - 1) * 100 if then else 0.0
+        lines.append(f'timing {stage:<8} {now:.3f}s baseline {then:.3f}s {change:+.0f}% {status}')
+
+    lines.append(f'result {"PASS" if passed else "FAIL"}')
+    return lines, passed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check recognition decisions and timings against golden results.')
+    parser.add_argument('--golden', default=Golden, help='golden results file')
+    parser.add_argument('--update', action='store_true', help='record the current results as golden')
+    parser.add_argument('--report', help='write the report to this file')
+    parser.add_argument('--repeats', type=int, default=3, help='pipeline runs, timings keep the fastest')
+    parser.add_argument('--words', type=int, default=45, help='words decided per test')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='relative slowdown allowed per stage')
+    parser.add_argument('--slack', type=float, default=0.05, help='absolute slowdown allowed per stage, in seconds')
+    parser.add_argument('--corpus', help='keep the synthetic corpus in this directory')
+    args = parser.parse_args()
+
+    # Loading a Testcase prints every sample, which would bury the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = measure(args.repeats, args.words, args.corpus)
+    if args.update:
+        with open(args.golden, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f'golden results written to {args.golden}')
+        sys.exit(0)
+
+    with open(args.golden, encoding='utf-8') as f:
+        golden = json.load(f)
+    if golden.get('version') != Version:
+        sys.exit(f'{args.golden} has version {golden.get("version")}, expected {Version}')
+    lines, passed = compare(results, golden, args.tolerance, args.slack)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+    for line in lines:
+        if not line.endswith(' ok'):
+            print(line)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,272 @@
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+import numpy as np
+import soundfile
+import ingest
+import subsequence
+
+# Reference templates of every speaker type, set in each worker process by _init_worker
+_templates = None
+
+
+def _init_worker(templates, features):
+    from recognition import WordRecognition
+
+    global _templates
+    _templates = templates
+    # Spawned workers start with the default pipeline, not the one the templates were built with
+    WordRecognition.Features = features
+
+
+def endpoints(y, sr, frame=400, hop=160, min_silence=0.15, min_speech=0.08, margin=0.05):
+    """
+    Finds the spoken regions of a recording from its short-time energy.
+
+    The threshold sits between the noise floor and the speech level (the 10th and 90th
+    percentiles of the frame energy in dB); regions separated by less than ``min_silence``
+    seconds are merged and regions shorter than ``min_speech`` seconds dropped.
+
+    Args:
+        y (numpy.ndarray): The audio data.
+        sr (int): The sample rate of the audio data.
+        frame (int): The energy frame length in samples.
+        hop (int): The hop between energy frames in samples.
+        min_silence (float): The shortest pause separating two words, in seconds.
+        min_speech (float): The shortest word, in seconds.
+        margin (float): The padding added around every region, in seconds.
+
+    Returns:
+        list: The (start, end) sample positions of every region.
+    """
+    if len(y) < frame:
+        return []
+    count = 1 + (len(y) - frame) // hop
+    frames = np.lib.stride_tricks.as_strided(y, shape=(count, frame), strides=(y.strides[0] * hop, y.strides[0]))
+    energy = 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-12)
+    floor, level = np.percentile(energy, [10, 90])
+    active = energy > floor + 0.3 * (level - floor)
+
+    changes = np.flatnonzero(np.diff(np.concatenate([[0], active.astype(np.int8), [0]])))
+    regions = [[s * hop, (e - 1) * hop + frame] for s, e in zip(changes[::2], changes[1::2])]
+
+    merged = []
+    for region in regions:
+        if merged and region[0] - merged[-1][1] < min_silence * sr:
+            merged[-1][1] = region[1]
+        else:
+            merged.append(region)
+
+    pad = int(margin * sr)
+    return [(max(s - pad, 0), min(e + pad, len(y))) for s, e in merged if e - s >= min_speech * sr]
+
+
+def align_segments(segments, templates, max_merge=3, skip_penalty=1.0):
+    """
+    Assigns the words, in reading order, to consecutive groups of spoken regions.
+
+    A dynamic program over (word, region) lets every word take one to ``max_merge`` adjacent
+    regions (a word broken by a pause) and lets regions be skipped as noise at ``skip_penalty``,
+    minimizing the total length-normalized DTW cost against the reference templates.
+
+    Args:
+        segments (list): The features of every spoken region, in time order.
+        templates (list): For every word, its list of reference feature matrices.
+        max_merge (int): The most regions a single word may span.
+        skip_penalty (float): The cost of leaving a region unassigned.
+
+    Returns:
+        list: The (first region, last region) of every word, or None when there are fewer
+        regions than words.
+    """
+    from recognition import WordRecognition
+
+    words, count = len(templates), len(segments)
+    if count < words:
+        return None
+
+    def cost(w, a, b):
+        features = np.concatenate(segments[a:b + 1], axis=1)
+        return min(WordRecognition.compare_features(features, t) / (features.shape[1] + t.shape[1])
+                   for t in templates[w])
+
+    # best[w, b]: the cost of placing the first w words in the first b regions
+    best = np.full((words + 1, count + 1), np.inf)
+    best[0] = np.arange(count + 1) * skip_penalty
+    choice = {}
+    for w in range(1, words + 1):
+        for b in range(w, count + 1):
+            # Region b - 1 is skipped
+            options = [(best[w, b - 1] + skip_penalty, None)]
+            for length in range(1, max_merge + 1):
+                a = b - length
+                if a < w - 1 or not np.isfinite(best[w - 1, a]):
+                    continue
+                options.append((best[w - 1, a] + cost(w - 1, a, b - 1), a))
+            best[w, b], choice[w, b] = min(options, key=lambda o: o[0])
+
+    spans = []
+    w, b = words, count
+    while w > 0:
+        a = choice[w, b]
+        if a is None:
+            b -= 1
+        else:
+            spans.append((a, b - 1))
+            w, b = w - 1, a
+    return spans[::-1]
+
+
+def spot_in_order(features, templates):
+    """
+    Finds the words in reading order with subsequence DTW, each starting after the previous one ends.
+
+    Used when the energy endpointing finds fewer regions than words, for example when words are
+    read without pauses. Every word is aligned once with the whole recording, giving for every
+    end frame its best start and length-normalized cost; a dynamic program over (word, end frame)
+    then picks the ordered matches of lowest total cost, like ``align_segments``, so one word
+    matching far ahead cannot push the later words past the end of the recording.
+
+    Returns:
+        list: The (start frame, end frame) of every word.
+
+    Raises:
+        ValueError: If the recording has fewer frames than words.
+    """
+    words, frames = len(templates), features.shape[1]
+    if frames < words:
+        raise ValueError(f'{frames} frames cannot hold {words} words')
+
+    costs = np.full((words, frames), np.inf)
+    starts = np.zeros((words, frames), dtype=int)
+    for w, refs in enumerate(templates):
+        for t in refs:
+            c, start, steps = subsequence.subsequence_dtw(t, features)
+            better = c / steps < costs[w]
+            costs[w] = np.where(better, c / steps, costs[w])
+            starts[w] = np.where(better, start, starts[w])
+
+    # best[w, e]: the cost of the first w + 1 words with word w ending at frame e
+    best = np.full((words, frames), np.inf)
+    best[0] = costs[0]
+    previous = np.zeros((words, frames), dtype=int)
+    for w in range(1, words):
+        # The best end of the previous word before every frame
+        before = np.minimum.accumulate(best[w - 1])
+        where = np.maximum.accumulate(np.where(best[w - 1] <= before, np.arange(frames), 0))
+        s = starts[w]
+        allowed = s > 0
+        best[w, allowed] = costs[w, allowed] + before[s[allowed] - 1]
+        previous[w, allowed] = where[s[allowed] - 1]
+
+    if not np.isfinite(best[-1]).any():
+        raise ValueError('the words cannot be matched in order')
+    spans = []
+    end = int(np.argmin(best[-1]))
+    for w in range(words - 1, -1, -1):
+        spans.append((int(starts[w, end]), end))
+        end = int(previous[w, end])
+    return spans[::-1]
+
+
+def word_name(info, index, marker='M'):
+    """
+    Builds the file name ``Testcase.extract_information`` parses for word ``index``.
+
+    Args:
+        info (dict): The ``group``, ``student_number``, ``speaker type`` and ``speaker age``.
+        index (int): The position of the word in ``WordsList``.
+        marker (str): The 'W' or 'M' letter preceding the word pair.
+    """
+    return (f"G{info['group']:02d}S{info['student_number']}{info['speaker type']}{info['speaker age']:02d}"
+            f"{marker}P{index // 2 + 1:02d}W{index % 2 + 1}")
+
+
+def parse_recording(path):
+    """
+    Reads the group, student, speaker type and age from a session recording named ``G..S..``.
+    """
+    a = re.findall(r'G(\d+)S(\d)(\S)(\d+)', os.path.basename(path))
+    if not a:
+        raise ValueError(f'{path} is not named G<group>S<student><type><age>')
+    a = a[0]
+    return {'group': int(a[0]), 'student_number': int(a[1]), 'speaker type': a[2], 'speaker age': int(a[3])}
+
+
+def segment_recording(path, output, templates=None):
+    """
+    Cuts a session recording into one file per word, in the ``Segments`` layout.
+
+    Args:
+        path (str): The session recording, named ``G<group>S<student><type><age>...``.
+        output (str): The directory receiving the ``Wav`` directory of the words.
+        templates (dict): For every speaker type, the reference feature matrices of every word.
+            The templates given to the worker processes are used by default.
+
+    Returns:
+        list: The paths of the written files.
+    """
+    from recognition import WordRecognition
+
+    templates = (templates or _templates)
+    info = parse_recording(path)
+    refs = templates[info['speaker type']]
+    sr = WordRecognition.SampleRate
+    y = np.ascontiguousarray(ingest.load(path))
+
+    regions = endpoints(y, sr)
+    spans = align_segments([WordRecognition.extract_features(y[s:e]) for s, e in regions], refs)
+    if spans is not None:
+        cuts = [(regions[a][0], regions[b][1]) for a, b in spans]
+    else:
+        hop = WordRecognition.Features.frame_step
+        cuts = [(s * hop, min((e + 1) * hop, len(y))) for s, e in spot_in_order(WordRecognition.extract_features(y), refs)]
+
+    os.makedirs(output + '\\Wav', exist_ok=True)
+    files = []
+    for index, (start, end) in enumerate(cuts):
+        file = output + '\\Wav\\' + word_name(info, index) + '.wav'
+        soundfile.write(file, y[start:end], sr, subtype='PCM_16')
+        files.append(file)
+    return files
+
+
+def segment_class(recordings, output, wr, processes=None):
+    """
+    Segments the session recordings of a whole class in parallel.
+
+    Every recording ``G..S...wav`` is written to ``output\\<recording name>\\Wav``.
+
+    Args:
+        recordings (list): The session recordings.
+        output (str): The root directory of the segmented recordings.
+        wr (WordRecognition): The recognizer whose references are aligned against.
+        processes (int): The number of worker processes, all cores by default.
+
+    Returns:
+        dict: The written files of every recording.
+    """
+    from recognition import WordRecognition
+
+    types = {parse_recording(r)['speaker type'] for r in recordings}
+    templates = {g: [WordRecognition.reference_features(s) for s in wr.getReferenceCases(g)] for g in types}
+    targets = [output + '\\' + os.path.splitext(os.path.basename(r))[0] for r in recordings]
+    with ProcessPoolExecutor(processes, initializer=_init_worker,
+                             initargs=(templates, WordRecognition.Features)) as pool:
+        return dict(zip(recordings, pool.map(segment_recording, recordings, targets)))
+
+
+if __name__ == '__main__':
+    from recognition import WordRecognition
+
+    parser = argparse.ArgumentParser(description='Cut session recordings into per-word Segments.')
+    parser.add_argument('output', help='root directory of the segmented recordings')
+    parser.add_argument('recordings', nargs='+', help='session recordings named G<group>S<student><type><age>')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes')
+    args = parser.parse_args()
+
+    recordings = [f for pattern in args.recordings for f in glob(pattern)]
+    for recording, files in segment_class(recordings, args.output, WordRecognition(), args.processes).items():
+        print(f'{recording}: {len(files)} files')
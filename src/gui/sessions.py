@@ -0,0 +1,241 @@
+import argparse
+import collections
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from recognition import WordRecognition, WordsList
+
+
+class LatencyStats:
+    """
+    The queueing and recognition times of the requests of one session.
+    """
+
+    def __init__(self, window=1000):
+        self.__waits = collections.deque(maxlen=window)
+        self.__totals = collections.deque(maxlen=window)
+        self.__lock = threading.Lock()
+        self.requests = 0
+
+    def add(self, wait, total):
+        with self.__lock:
+            self.__waits.append(wait)
+            self.__totals.append(total)
+            self.requests += 1
+
+    def report(self):
+        """
+        Returns:
+            dict: The request count and the mean, median and 95th percentile of the queueing
+            and total latencies over the recent requests, in milliseconds.
+        """
+        with self.__lock:
+            waits = np.array(self.__waits) * 1000
+            totals = np.array(self.__totals) * 1000
+            requests = self.requests
+        if not requests:
+            return {'requests': 0}
+        return {
+            'requests': requests,
+            'wait mean': float(waits.mean()),
+            'total mean': float(totals.mean()),
+            'total p50': float(np.percentile(totals, 50)),
+            'total p95': float(np.percentile(totals, 95)),
+        }
+
+
+class RecognitionHub:
+    """
+    Serves recognition requests of many capture sessions with one shared recognizer.
+
+    Every session has its own queue and the worker threads take requests round-robin across the
+    sessions with pending work, so a busy station cannot starve the others. The reference
+    features are extracted before serving, after which the recognizer only reads its references
+    and can be shared by all workers.
+    """
+
+    def __init__(self, wr, workers=1):
+        """
+        Args:
+            wr (WordRecognition): The shared recognizer.
+            workers (int): The number of recognition threads.
+        """
+        self.__wr = wr
+        for g in ('M', 'F', 'C'):
+            for sample in wr.getReferenceCases(g):
+                WordRecognition.reference_features(sample)
+
+        self.__queues = collections.OrderedDict()
+        self.__stats = {}
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__threads = [threading.Thread(target=self.__serve, daemon=True) for _ in range(workers)]
+        for thread in self.__threads:
+            thread.start()
+
+    def submit(self, session, kind, signal, gender=None, index=None):
+        """
+        Queues a recognition request of a session.
+
+        Args:
+            session (str): The name of the session.
+            kind (str): 'gender' for ``decide_gender``, 'pair' for ``decide_speech_pair`` or
+                'recognize' for ``recognize``.
+            signal (numpy.ndarray): The recorded audio data.
+            gender (str): The speaker type, for 'pair' requests and optionally 'recognize' ones.
+            index (int): The word index, for 'pair' requests and optionally 'recognize' ones.
+
+        Returns:
+            concurrent.futures.Future: The result of the decision.
+        """
+        if kind not in ('gender', 'pair', 'recognize'):
+            raise ValueError(f'unknown request {kind}')
+        future = Future()
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError('the hub is closed')
+            self.__queues.setdefault(session, collections.deque()).append(
+                (kind, signal, gender, index, future, time.perf_counter()))
+            self.__stats.setdefault(session, LatencyStats())
+            self.__condition.notify()
+        return future
+
+    def stats(self):
+        """
+        Returns:
+            dict: The latency report of every session.
+        """
+        with self.__condition:
+            stats = dict(self.__stats)
+        return {session: s.report() for session, s in stats.items()}
+
+    def pending(self):
+        with self.__condition:
+            return {session: len(queue) for session, queue in self.__queues.items()}
+
+    def __next_request(self):
+        """
+        Takes the oldest request of the first session with work and moves that session to the back.
+        """
+        for session, queue in self.__queues.items():
+            if queue:
+                self.__queues.move_to_end(session)
+                return session, queue.popleft()
+        return None
+
+    def __serve(self):
+        while True:
+            with self.__condition:
+                request = self.__next_request()
+                while request is None:
+                    if self.__closed:
+                        return
+                    self.__condition.wait()
+                    request = self.__next_request()
+
+            session, (kind, signal, gender, index, future, submitted) = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            try:
+                if kind == 'gender':
+                    result = self.__wr.decide_gender(signal)[0]
+                elif kind == 'recognize':
+                    result = self.__wr.recognize(signal, index, gender)
+                else:
+                    result = self.__wr.decide_speech_pair(signal, gender, index)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            self.__stats[session].add(started - submitted, time.perf_counter() - submitted)
+
+    def close(self):
+        """
+        Stops the workers once the queued requests are served.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        for thread in self.__threads:
+            thread.join()
+
+
+class CaptureSession:
+    """
+    One recording station: a microphone on its own input device, recording to memory and
+    submitting to a shared ``RecognitionHub``.
+    """
+
+    def __init__(self, name, hub, device=None, p=None, rate=WordRecognition.SampleRate):
+        """
+        Args:
+            name (str): The name of the session.
+            hub (RecognitionHub): The hub serving the session.
+            device (int): The PyAudio input device index, or None for the default device.
+            p (pyaudio.PyAudio): A PyAudio instance shared by the sessions.
+            rate (int): The recording rate, which must match the recognizer rate.
+        """
+        from mic import MicrophoneRecorder
+
+        self.name = name
+        self.__hub = hub
+        self.mic = MicrophoneRecorder(rate=rate, device=device, p=p)
+        self.mic.start()
+
+    def start(self):
+        self.mic.start_recording()
+
+    def check_gender(self):
+        """
+        Stops recording and submits the recording to ``decide_gender``.
+        """
+        return self.__hub.submit(self.name, 'gender', self.mic.take_recording())
+
+    def check_pair(self, gender, index):
+        """
+        Stops recording and submits the recording to ``decide_speech_pair``.
+        """
+        return self.__hub.submit(self.name, 'pair', self.mic.take_recording(), gender, index)
+
+    def close(self):
+        self.mic.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve several recording stations with one recognizer.')
+    parser.add_argument('devices', type=int, nargs='*', help='input device indices, one per station')
+    parser.add_argument('--list', action='store_true', help='list the input devices')
+    parser.add_argument('--gender', choices=['M', 'F', 'C'], default='M', help='speaker type of the stations')
+    parser.add_argument('--seconds', type=float, default=1.5, help='recording time per word')
+    parser.add_argument('--workers', type=int, default=2, help='recognition threads')
+    args = parser.parse_args()
+
+    import pyaudio
+
+    p = pyaudio.PyAudio()
+    if args.list:
+        for i in range(p.get_device_count()):
+            info = p.get_device_info_by_index(i)
+            if info['maxInputChannels'] > 0:
+                print(i, info['name'])
+    else:
+        import snapshot
+
+        hub = RecognitionHub(snapshot.load_or_build('recognizer.snapshot'), args.workers)
+        stations = [CaptureSession(f'station-{d}', hub, d, p) for d in args.devices]
+        for index in range(len(WordsList) - 2):
+            print(f'Read: {WordsList[index]}')
+            for station in stations:
+                station.start()
+            time.sleep(args.seconds)
+            results = [(s.name, s.check_pair(args.gender, index)) for s in stations]
+            for name, future in results:
+                print(f'  {name}: {future.result()}')
+        hub.close()
+        for station in stations:
+            station.close()
+        for name, report in hub.stats().items():
+            print(name, report)
+    p.terminate()
@@ -0,0 +1,282 @@
+import argparse
+import collections
+import multiprocessing
+import secrets
+import threading
+import time
+from glob import glob
+from multiprocessing.managers import BaseManager
+import evaluation
+
+
+class JobBoard:
+    """
+    The coordinator's queue of (test directory, word) jobs.
+
+    A job handed to a worker is leased for ``lease`` seconds and extended by its heartbeats.
+    Jobs whose lease expires, because their worker died or lost its connection, go back to the
+    queue; a result arriving late for a job already completed elsewhere is ignored.
+    """
+
+    def __init__(self, jobs, lease=120.0):
+        self.__jobs = dict(enumerate(jobs))
+        self.__pending = collections.deque(self.__jobs)
+        self.__leases = {}
+        self.__results = {}
+        self.__new = []
+        self.__lease = lease
+        self.__lock = threading.Lock()
+        self.requeued = 0
+
+    def get_job(self, worker):
+        """
+        Returns:
+            tuple: The job id and (directory, index) job, or None when nothing is pending.
+        """
+        with self.__lock:
+            self.__requeue_expired()
+            if not self.__pending:
+                return None
+            job_id = self.__pending.popleft()
+            self.__leases[job_id] = (worker, time.monotonic() + self.__lease)
+            return job_id, self.__jobs[job_id]
+
+    def heartbeat(self, worker):
+        with self.__lock:
+            deadline = time.monotonic() + self.__lease
+            for job_id, (owner, _) in list(self.__leases.items()):
+                if owner == worker:
+                    self.__leases[job_id] = (owner, deadline)
+
+    def complete(self, worker, job_id, record):
+        with self.__lock:
+            self.__leases.pop(job_id, None)
+            if job_id not in self.__results:
+                self.__results[job_id] = record
+                self.__new.append(record)
+                # A requeued job finished by its first worker after all
+                if job_id in self.__pending:
+                    self.__pending.remove(job_id)
+
+    def finished(self):
+        with self.__lock:
+            return len(self.__results) == len(self.__jobs)
+
+    def take_results(self):
+        """
+        Returns:
+            list: The records completed since the previous call.
+        """
+        with self.__lock:
+            new, self.__new = self.__new, []
+            return new
+
+    def status(self):
+        with self.__lock:
+            return {'jobs': len(self.__jobs), 'done': len(self.__results), 'pending': len(self.__pending),
+                    'leased': len(self.__leases), 'requeued': self.requeued}
+
+    def __requeue_expired(self):
+        now = time.monotonic()
+        for job_id, (worker, deadline) in list(self.__leases.items()):
+            if deadline < now:
+                del self.__leases[job_id]
+                self.__pending.append(job_id)
+                self.requeued += 1
+
+
+class CoordinatorManager(BaseManager):
+    pass
+
+
+def coordinate(directories, authkey, log_path='results.csv', address=('127.0.0.1', 50000),
+               lease=120.0, words=45, poll=1.0, on_ready=None, processes=None):
+    """
+    Serves the evaluation jobs to workers and merges their results into the standard reports.
+
+    Jobs already present in the row log are not queued again, so a restarted coordinator only
+    serves what is missing. Results are appended to the log as they arrive and the per-gender
+    reports are written with ``evaluation.summarize`` once every job is done.
+
+    The manager protocol unpickles what clients send, so anyone holding the key can run code
+    on this machine. The coordinator only listens on the loopback interface unless another
+    address is given, and the key has no default.
+
+    Args:
+        directories (list): The test directories, as seen by the workers.
+        authkey (bytes): The key workers authenticate with.
+        log_path (str): The row log results are merged into.
+        address (tuple): The host and port to listen on.
+        lease (float): The seconds a worker may hold a job without a heartbeat.
+        words (int): The number of words evaluated per directory.
+        poll (float): The seconds between merges into the log.
+        on_ready (callable): Called once the server is listening.
+        processes (list): Local worker processes; when all of them exit before the jobs are
+            done, the coordinator fails instead of waiting forever.
+
+    Raises:
+        ValueError: If the key is empty.
+        RuntimeError: If every local worker exited before the jobs were done.
+    """
+    if not authkey:
+        raise ValueError('an authkey is required')
+    done = evaluation.completed(log_path)
+    jobs = [(d, x) for d in directories for x in range(words) if x not in done.get(d, set())]
+    board = JobBoard(jobs, lease)
+
+    CoordinatorManager.register('board', callable=lambda: board)
+    manager = CoordinatorManager(address=address, authkey=authkey)
+    # The listening socket is bound here, so workers may connect from now on
+    server = manager.get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if on_ready is not None:
+        on_ready()
+
+    f, writer = evaluation.open_log(log_path)
+    try:
+        with f:
+            while True:
+                # Checked first, so the jobs a worker completed before exiting are already counted
+                stopped = processes and not any(p.is_alive() for p in processes)
+                finished = board.finished()
+                for record in board.take_results():
+                    writer.writerow(record)
+                f.flush()
+                if finished:
+                    break
+                if stopped:
+                    raise RuntimeError(f'every worker exited with {board.status()["done"]} of '
+                                       f'{board.status()["jobs"]} jobs done')
+                time.sleep(poll)
+    finally:
+        server.stop_event.set()
+    evaluation.summarize(log_path)
+    return board.status()
+
+
+def connect(address, authkey, attempts=6, delay=0.5):
+    """
+    Connects to a coordinator, retrying with exponential backoff while it is not listening yet.
+
+    Raises:
+        ConnectionRefusedError: If the coordinator still refuses after every attempt.
+    """
+    CoordinatorManager.register('board')
+    for attempt in range(attempts):
+        manager = CoordinatorManager(address=address, authkey=authkey)
+        try:
+            manager.connect()
+            return manager
+        except ConnectionRefusedError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+
+def work(address, authkey, worker=None, cached=2, heartbeat=10.0, idle=1.0):
+    """
+    Pulls jobs from a coordinator until every job is done.
+
+    The features of the last ``cached`` test directories are kept, so consecutive jobs of the
+    same directory only cost their alignments. Results are sent back as compact row records.
+
+    Args:
+        address (tuple): The host and port of the coordinator.
+        authkey (bytes): The key shared with the coordinator.
+        worker (str): The name of this worker, the process name by default.
+        cached (int): The number of test directories kept in memory.
+        heartbeat (float): The seconds between lease extensions.
+        idle (float): The seconds to wait when every job is leased to someone else.
+    """
+    # Imported here so the coordinator does not load the recognizer
+    from compact import CompactTestcase
+    from recognition import WordRecognition
+
+    manager = connect(address, authkey)
+    board = manager.board()
+    worker = worker or multiprocessing.current_process().name
+
+    stop = threading.Event()
+
+    def beat():
+        # A separate connection, since proxies are not shared between threads
+        try:
+            beat_manager = connect(address, authkey)
+            beat_board = beat_manager.board()
+        except ConnectionError:
+            return
+        while not stop.wait(heartbeat):
+            try:
+                beat_board.heartbeat(worker)
+            except (EOFError, ConnectionError):
+                return
+
+    threading.Thread(target=beat, daemon=True).start()
+
+    wr = WordRecognition()
+    tests = collections.OrderedDict()
+    try:
+        while True:
+            try:
+                job = board.get_job(worker)
+                if job is None and board.finished():
+                    return
+            except (EOFError, ConnectionError):
+                # The coordinator shuts down once every job is done
+                return
+            if job is None:
+                time.sleep(idle)
+                continue
+
+            job_id, (directory, x) = job
+            if directory not in tests:
+                tests[directory] = CompactTestcase(directory)
+                if len(tests) > cached:
+                    tests.popitem(last=False)
+            test = tests[directory]
+            tests.move_to_end(directory)
+
+            sample = test.get_case(x)
+            g = sample['speaker type']
+            board.complete(worker, job_id, {'directory': directory, 'index': x, 'name': sample['name'],
+                                            'speaker type': g, 'decision': wr.decide_speech_pair(test, g, x)})
+    finally:
+        stop.set()
+
+
+def run_local(directories, workers=4, log_path='results.csv', address=('127.0.0.1', 50000), authkey=None):
+    """
+    Runs a coordinator with local worker processes standing in for other hosts.
+
+    The workers are started once the coordinator listens, with a random key when none is given.
+    """
+    authkey = authkey or secrets.token_bytes(16)
+    processes = [multiprocessing.Process(target=work, args=(address, authkey, f'local-{i}'), daemon=True)
+                 for i in range(workers)]
+    status = coordinate(directories, authkey, log_path, address, on_ready=lambda: [p.start() for p in processes],
+                        processes=processes)
+    for p in processes:
+        p.join()
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sharded evaluation of the recognizer.')
+    parser.add_argument('role', choices=['coordinator', 'worker', 'local'])
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='coordinator host; the coordinator listens on it, use 0.0.0.0 to accept other hosts')
+    parser.add_argument('--port', type=int, default=50000, help='coordinator port')
+    parser.add_argument('--authkey', help='shared key, required for coordinator and worker')
+    parser.add_argument('--workers', type=int, default=4, help='local worker processes')
+    args = parser.parse_args()
+
+    directories = [file + '\\Segments' for file in sorted(glob('Testcases/*'))]
+    authkey = args.authkey.encode() if args.authkey else None
+    if args.role != 'local' and not authkey:
+        parser.error('--authkey is required')
+    if args.role == 'coordinator':
+        print(coordinate(directories, authkey, address=(args.host, args.port)))
+    elif args.role == 'worker':
+        work((args.host, args.port), authkey)
+    else:
+        print(run_local(directories, args.workers, address=(args.host, args.port), authkey=authkey))
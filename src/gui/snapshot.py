@@ -0,0 +1,140 @@
+import glob
+import json
+import os
+import pickle
+import struct
+from recognition import WordRecognition
+
+Magic = b'SRSSNAP1'
+Version = 3
+Header = struct.Struct('<8sI')
+
+
+def source_signature(path):
+    """
+    Lists the files a reference was loaded from with their modification time and size.
+
+    Args:
+        path (str): A ``Testcase`` directory or a reference file.
+
+    Returns:
+        list: The [file, mtime_ns, size] of every source file.
+    """
+    if os.path.isfile(path):
+        files = [path]
+    else:
+        files = sorted(glob.glob(path + '\\Wav\\*.wav') + glob.glob(path + '\\*.mp3'))
+    signature = []
+    for file in files:
+        st = os.stat(file)
+        signature.append([file, st.st_mtime_ns, st.st_size])
+    return signature
+
+
+def describe(wr):
+    """
+    Returns:
+        dict: What a snapshot of the recognizer depends on: the snapshot version, the feature
+        pipeline and the files of every reference.
+    """
+    sources = wr.getReferenceSources()
+    return {
+        'version': Version,
+        'features': WordRecognition.Features.key(),
+        'sources': {g: [path, source_signature(path) if path is not None else None]
+                    for g, path in sorted(sources.items())},
+    }
+
+
+def save_snapshot(wr, path):
+    """
+    Writes a fully initialized recognizer to one file.
+
+    The features of every reference sample are extracted first, so the snapshot holds the
+    references, their features and templates, the speaker classifier and the embedding indexes.
+    The file is a small JSON header describing what the snapshot depends on, followed by the
+    pickled recognizer, and is replaced atomically.
+
+    Args:
+        wr (WordRecognition): The recognizer.
+        path (str): The snapshot file.
+    """
+    for g in ('M', 'F', 'C'):
+        for sample in wr.getReferenceCases(g):
+            WordRecognition.reference_features(sample)
+
+    header = json.dumps(describe(wr)).encode('utf-8')
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(Header.pack(Magic, len(header)))
+        f.write(header)
+        pickle.dump(wr, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+def _read_header(f):
+    """
+    Reads the header of an open snapshot, leaving the file at the pickled recognizer.
+
+    Returns:
+        dict: The header, or None when the file is not a snapshot.
+    """
+    start = f.read(Header.size)
+    if len(start) < Header.size:
+        return None
+    magic, length = Header.unpack(start)
+    if magic != Magic:
+        return None
+    return json.loads(f.read(length).decode('utf-8'))
+
+
+def is_current(header):
+    """
+    Checks a snapshot header against the current feature pipeline and reference files.
+    """
+    if header is None or header['version'] != Version or header['features'] != WordRecognition.Features.key():
+        return False
+    for path, signature in header['sources'].values():
+        if path is None:
+            continue
+        try:
+            if source_signature(path) != signature:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def load_snapshot(path):
+    """
+    Restores a recognizer written by ``save_snapshot``.
+
+    Snapshots are only loaded from trusted local files, since they are pickles.
+
+    Args:
+        path (str): The snapshot file.
+
+    Returns:
+        WordRecognition: The recognizer, or None when the snapshot is missing, of another version,
+        or stale because a reference file or the feature pipeline changed.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        if not is_current(_read_header(f)):
+            return None
+        return pickle.load(f)
+
+
+def load_or_build(path):
+    """
+    Restores the recognizer from its snapshot, or builds it and writes a new snapshot.
+
+    Returns:
+        WordRecognition: The initialized recognizer.
+    """
+    wr = load_snapshot(path)
+    if wr is None:
+        wr = WordRecognition()
+        save_snapshot(wr, path)
+    return wr
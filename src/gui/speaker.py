@@ -0,0 +1,204 @@
+import argparse
+import numpy as np
+from testcase import Testcase
+
+
+class SpeakerClassifier:
+    """
+    A speaker-class classifier built on pitch and spectral statistics.
+
+    Every utterance is summarized by a handful of statistics (F0 median and spread, voiced
+    ratio, spectral centroid, bandwidth and roll-off) computed in one vectorized pass over its
+    frames, and classified by a diagonal Gaussian per speaker type. No alignment is involved,
+    so the cost is linear in the length of the recording.
+
+    Attributes:
+        Types (list): The speaker types the classifier decides between.
+        FrameLength (int): The analysis frame length in samples.
+        HopLength (int): The hop between analysis frames in samples.
+        MinPitch (float): The lowest F0 searched for, in Hz.
+        MaxPitch (float): The highest F0 searched for, in Hz.
+        VoicingThreshold (float): The YIN threshold below which a frame counts as voiced.
+    """
+    Types = ['M', 'F', 'C']
+
+    FrameLength = 1024
+    HopLength = 256
+    MinPitch = 60.0
+    MaxPitch = 500.0
+    VoicingThreshold = 0.3
+
+    def __init__(self):
+        self.__means = None
+        self.__variances = None
+        self.__types = list(SpeakerClassifier.Types)
+
+    @staticmethod
+    def __frames(x):
+        """
+        Splits the signal into overlapping frames without copying.
+        """
+        length = SpeakerClassifier.FrameLength
+        if len(x) < length:
+            x = np.pad(x, (0, length - len(x)))
+        count = 1 + (len(x) - length) // SpeakerClassifier.HopLength
+        strides = (x.strides[0] * SpeakerClassifier.HopLength, x.strides[0])
+        return np.lib.stride_tricks.as_strided(x, shape=(count, length), strides=strides)
+
+    @staticmethod
+    def pitch(x, sr):
+        """
+        Estimates the F0 of every frame with a YIN-style cumulative mean normalized difference.
+
+        Args:
+            x (numpy.ndarray): The audio data.
+            sr (int): The sample rate of the audio data.
+
+        Returns:
+            tuple: The F0 of every frame in Hz and a boolean mask of the voiced frames.
+        """
+        frames = SpeakerClassifier.__frames(np.asarray(x, dtype=np.float32))
+        frames = frames - frames.mean(axis=1, keepdims=True)
+        length = frames.shape[1]
+        max_lag = min(int(sr / SpeakerClassifier.MinPitch), length // 2)
+        min_lag = max(int(sr / SpeakerClassifier.MaxPitch), 2)
+
+        # Autocorrelation of all frames at once through the FFT
+        spectrum = np.fft.rfft(frames, n=2 * length, axis=1)
+        r = np.fft.irfft(np.abs(spectrum) ** 2, axis=1)[:, :max_lag + 1]
+
+        # Difference function, then its cumulative mean normalization
+        d = 2 * (r[:, :1] - r)
+        cumulative = np.cumsum(d[:, 1:], axis=1)
+        lags = np.arange(1, max_lag + 1)
+        cmnd = np.ones_like(d)
+        cmnd[:, 1:] = d[:, 1:] * lags / np.maximum(cumulative, np.finfo(np.float32).tiny)
+
+        search = cmnd[:, min_lag:]
+        below = search < SpeakerClassifier.VoicingThreshold
+        first = np.where(below.any(axis=1), below.argmax(axis=1), search.argmin(axis=1))
+        # Follow the dip below the threshold down to its local minimum
+        falling = np.append(search[:, 1:] < search[:, :-1], np.zeros((len(search), 1), bool), axis=1)
+        bottom = ~falling & (np.arange(search.shape[1]) >= first[:, None])
+        first = bottom.argmax(axis=1)
+        lag = first + min_lag
+        voiced = search[np.arange(len(search)), first] < SpeakerClassifier.VoicingThreshold
+
+        # Silence has no pitch even when its difference function dips
+        energy = np.sqrt(np.mean(frames ** 2, axis=1))
+        voiced &= energy > 0.1 * energy.max()
+
+        return sr / lag, voiced
+
+    @staticmethod
+    def statistics(x, sr):
+        """
+        Summarizes an utterance by its pitch and spectral statistics.
+
+        Args:
+            x (numpy.ndarray): The audio data.
+            sr (int): The sample rate of the audio data.
+
+        Returns:
+            numpy.ndarray: The feature vector of the utterance.
+        """
+        f0, voiced = SpeakerClassifier.pitch(x, sr)
+        voiced_f0 = f0[voiced] if voiced.any() else f0
+        log_f0 = np.log(voiced_f0)
+
+        frames = SpeakerClassifier.__frames(np.asarray(x, dtype=np.float32))
+        magnitude = np.abs(np.fft.rfft(frames * np.hanning(frames.shape[1]), axis=1))
+        freqs = np.fft.rfftfreq(frames.shape[1], 1.0 / sr)
+        total = np.maximum(magnitude.sum(axis=1), np.finfo(np.float32).tiny)
+        centroid = (magnitude * freqs).sum(axis=1) / total
+        bandwidth = np.sqrt((magnitude * (freqs - centroid[:, None]) ** 2).sum(axis=1) / total)
+        rolloff = freqs[np.argmax(np.cumsum(magnitude, axis=1) >= 0.85 * total[:, None], axis=1)]
+
+        weights = total / total.sum()
+        return np.array([
+            np.median(log_f0),
+            np.std(log_f0),
+            voiced.mean(),
+            np.log(np.sum(weights * centroid) + 1),
+            np.log(np.sum(weights * bandwidth) + 1),
+            np.log(np.sum(weights * rolloff) + 1),
+        ])
+
+    def fit(self, directories, sr):
+        """
+        Fits the per-class statistics from labelled ``Testcase`` directories.
+
+        Speaker types without any sample are left out, so ``predict`` only decides between the
+        types it has seen.
+
+        Args:
+            directories (list): The ``Testcase`` directories, labelled by their speaker type.
+            sr (int): The sample rate of the audio data.
+
+        Raises:
+            ValueError: If the directories hold no sample of any speaker type.
+        """
+        features = {t: [] for t in SpeakerClassifier.Types}
+        for directory in directories:
+            for sample in Testcase(directory).get_cases():
+                if sample['speaker type'] in features:
+                    features[sample['speaker type']].append(SpeakerClassifier.statistics(sample['wav'], sr))
+
+        types = [t for t in SpeakerClassifier.Types if features[t]]
+        if not types:
+            raise ValueError('the directories hold no sample of any speaker type')
+        pooled = np.var(np.concatenate([features[t] for t in types]), axis=0)
+        self.__types = types
+        self.__means = np.array([np.mean(features[t], axis=0) for t in types])
+        # Regularize with the pooled variance so small classes stay usable
+        self.__variances = np.array([np.var(features[t], axis=0) + 0.1 * pooled for t in types])
+
+    def is_fitted(self):
+        return self.__means is not None
+
+    def predict(self, x, sr):
+        """
+        Decides the speaker type of an utterance.
+
+        Args:
+            x (numpy.ndarray): The audio data.
+            sr (int): The sample rate of the audio data.
+
+        Returns:
+            tuple: The predicted speaker type ('M', 'F' or 'C') and its posterior probability.
+        """
+        features = SpeakerClassifier.statistics(x, sr)
+        log_likelihood = -0.5 * np.sum((features - self.__means) ** 2 / self.__variances
+                                       + np.log(self.__variances), axis=1)
+        posterior = np.exp(log_likelihood - log_likelihood.max())
+        posterior /= posterior.sum()
+        best = int(np.argmax(posterior))
+        return self.__types[best], float(posterior[best])
+
+    def save(self, path):
+        np.savez(path, means=self.__means, variances=self.__variances, types=np.array(self.__types))
+
+    @staticmethod
+    def load(path):
+        classifier = SpeakerClassifier()
+        with np.load(path) as data:
+            classifier.__means = data['means']
+            classifier.__variances = data['variances']
+            # Files written before types were stored hold every type
+            if 'types' in data:
+                classifier.__types = [str(t) for t in data['types']]
+        return classifier
+
+
+if __name__ == '__main__':
+    # Imported here to keep the classifier usable without the recognizer
+    from recognition import WordRecognition
+
+    parser = argparse.ArgumentParser(description='Fit the pitch/spectral speaker classifier.')
+    parser.add_argument('output', help='classifier file to write')
+    parser.add_argument('directories', nargs='+', help='Testcase directories')
+    args = parser.parse_args()
+
+    classifier = SpeakerClassifier()
+    classifier.fit(args.directories, WordRecognition.SampleRate)
+    classifier.save(args.output)
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+def subsequence_dtw(query, recording):
+    """
+    Aligns a query with every subsequence of a longer recording in one pass.
+
+    The query may start at any frame of the recording at no cost. Each row of the accumulated
+    cost is one vectorized step: a horizontal run in the recurrence
+    ``D[i, j] = C[i, j] + min(D[i-1, j-1], D[i-1, j], D[i, j-1])`` is a running minimum over
+    prefix sums of the row costs, so no window is ever evaluated separately.
+
+    Args:
+        query (numpy.ndarray): The query features with shape (coefficients, n).
+        recording (numpy.ndarray): The recording features with shape (coefficients, m).
+
+    Returns:
+        tuple: For every end frame of the recording, the accumulated cost of the best alignment
+        of the whole query ending there, the frame where that alignment starts and its length.
+    """
+    q = query.T.astype(np.float64)
+    r = recording.T.astype(np.float64)
+    cost = np.sqrt(np.maximum((q ** 2).sum(axis=1)[:, None] + (r ** 2).sum(axis=1)[None, :] - 2 * q @ r.T, 0))
+    n, m = cost.shape
+    positions = np.arange(m)
+
+    previous = cost[0].copy()
+    starts = positions.copy()
+    steps = np.ones(m)
+    for i in range(1, n):
+        # Best predecessor from the previous row: diagonal or vertical
+        diagonal = np.concatenate([[np.inf], previous[:-1]])
+        use_diagonal = diagonal < previous
+        entry = np.where(use_diagonal, diagonal, previous)
+        entry_starts = np.where(use_diagonal, np.concatenate([[0], starts[:-1]]), starts)
+        entry_steps = np.where(use_diagonal, np.concatenate([[0], steps[:-1]]), steps) + 1
+
+        # Horizontal runs: D[j] = S[j] + min over k <= j of (entry[k] - S[k-1])
+        prefix = np.cumsum(cost[i])
+        offsets = entry - (prefix - cost[i])
+        best = np.minimum.accumulate(offsets)
+        origin = np.maximum.accumulate(np.where(offsets <= best, positions, 0))
+        previous = prefix + best
+        starts = entry_starts[origin]
+        steps = entry_steps[origin] + (positions - origin)
+
+    return previous, starts, steps
+
+
+def find_matches(costs, starts, steps, threshold=None):
+    """
+    Picks non-overlapping detections from the end costs of a subsequence alignment.
+
+    Costs are normalized by the alignment length, and detections are taken greedily from the
+    lowest cost while they do not overlap an earlier one.
+
+    Args:
+        costs (numpy.ndarray): The accumulated cost per end frame.
+        starts (numpy.ndarray): The start frame per end frame.
+        steps (numpy.ndarray): The alignment length per end frame.
+        threshold (float): The highest normalized cost kept, or None to keep all.
+
+    Returns:
+        list: The (start frame, end frame, normalized cost) of every detection.
+    """
+    normalized = costs / steps
+    taken = np.zeros(len(costs), dtype=bool)
+    matches = []
+    for end in np.argsort(normalized):
+        if threshold is not None and normalized[end] > threshold:
+            break
+        start = starts[end]
+        if taken[start:end + 1].any():
+            continue
+        taken[start:end + 1] = True
+        matches.append((int(start), int(end), float(normalized[end])))
+    return matches
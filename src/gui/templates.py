@@ -0,0 +1,234 @@
+import argparse
+import json
+import numpy as np
+from fastdtw import fastdtw
+from features import euclidean
+from testcase import Testcase
+
+
+class TemplateSet:
+    """
+    A reference set of averaged word templates built from many speakers.
+
+    It exposes the same accessors as ``Testcase`` so ``WordRecognition`` can use it in place of a
+    single speaker directory. Every sample carries its ``templates`` (one DTW barycenter per
+    cluster, shaped like ``WordRecognition.extract_features``) and the waveform of the most
+    central recording in ``wav``, which is used for plotting and playback.
+
+    Attributes:
+        Extension (str): The extension of template files.
+    """
+    Extension = '.npz'
+
+    def __init__(self, path):
+        self.__name = path
+        self.__testcases = []
+        self.__read_file()
+
+    def get_name(self):
+        return self.__name
+
+    def get_cases(self):
+        return self.__testcases
+
+    def get_case(self, i):
+        return self.__testcases[i]
+
+    def get_main_sample(self):
+        return self.__testcases[46]
+
+    def features_key(self):
+        """
+        Returns:
+            str: The ``FeatureConfig.key`` the templates were built with, or None for older files.
+        """
+        return self.__features_key
+
+    def __read_file(self):
+        with np.load(self.__name, allow_pickle=False) as data:
+            index = json.loads(str(data['index']))
+            self.__features_key = str(data['features']) if 'features' in data else None
+            for i, meta in enumerate(index):
+                sample = dict(meta)
+                sample['templates'] = [data[f't{i}_{j}'] for j in range(meta['templates'])]
+                sample['wav'] = data[f'w{i}']
+                self.__testcases.append(sample)
+
+    @staticmethod
+    def write(path, samples):
+        """
+        Writes template samples, as returned by ``build_templates``, to a single file.
+
+        Args:
+            path (str): The output file path.
+            samples (list): The template samples.
+        """
+        from recognition import WordRecognition
+
+        index = []
+        arrays = {}
+        for i, sample in enumerate(samples):
+            meta = {key: value for key, value in sample.items() if key not in ('templates', 'wav')}
+            meta['templates'] = len(sample['templates'])
+            index.append(meta)
+            for j, template in enumerate(sample['templates']):
+                arrays[f't{i}_{j}'] = template.astype(np.float32)
+            arrays[f'w{i}'] = sample['wav'].astype(np.float32)
+
+        np.savez_compressed(path, index=np.array(json.dumps(index)), features=np.array(WordRecognition.Features.key()),
+                            **arrays)
+
+
+def dtw_barycenter(sequences, initial, iterations=10):
+    """
+    Averages feature matrices with DTW Barycenter Averaging.
+
+    Args:
+        sequences (list): Feature matrices with shape (coefficients, frames).
+        initial (numpy.ndarray): The starting average, usually the medoid of the sequences.
+        iterations (int): The maximum number of refinement iterations.
+
+    Returns:
+        numpy.ndarray: The barycenter with the same number of frames as ``initial``.
+    """
+    average = initial.T.copy()
+    for _ in range(iterations):
+        sums = np.zeros_like(average)
+        counts = np.zeros(len(average))
+        for sequence in sequences:
+            frames = sequence.T
+            _, path = fastdtw(average, frames, dist=euclidean)
+            path = np.asarray(path)
+            np.add.at(sums, path[:, 0], frames[path[:, 1]])
+            np.add.at(counts, path[:, 0], 1)
+
+        updated = sums / counts[:, None]
+        if np.allclose(updated, average):
+            break
+        average = updated
+
+    return average.T
+
+
+def k_medoids(distances, k, iterations=100):
+    """
+    Clusters samples given their pairwise distance matrix.
+
+    Args:
+        distances (numpy.ndarray): A symmetric (n, n) distance matrix.
+        k (int): The number of clusters, capped at n.
+        iterations (int): The maximum number of assignment/update rounds.
+
+    Returns:
+        tuple: The medoid indices and the cluster label of every sample. Fewer than ``k``
+        medoids are returned when samples coincide, so every cluster has members.
+    """
+    n = len(distances)
+    k = min(k, n)
+    # Start from the global medoid and greedily add the farthest samples, never one twice
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < k:
+        nearest = distances[:, medoids].min(axis=1)
+        nearest[medoids] = -1
+        candidate = int(np.argmax(nearest))
+        if nearest[candidate] <= 0:
+            # Every other sample coincides with a medoid already chosen
+            break
+        medoids.append(candidate)
+
+    medoids = np.array(medoids)
+    for _ in range(iterations):
+        labels = np.argmin(distances[:, medoids], axis=1)
+        updated = medoids.copy()
+        empty = []
+        for c in range(len(medoids)):
+            members = np.flatnonzero(labels == c)
+            if len(members):
+                within = distances[np.ix_(members, members)].sum(axis=1)
+                updated[c] = members[np.argmin(within)]
+            else:
+                empty.append(c)
+        for c in empty:
+            # Reseed an empty cluster with the sample farthest from its own medoid
+            spread = distances[np.arange(n), medoids[labels]].copy()
+            spread[updated] = -1
+            updated[c] = int(np.argmax(spread))
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+
+    labels = np.argmin(distances[:, medoids], axis=1)
+    # Drop clusters still empty, so no template is averaged from no samples
+    kept = np.unique(labels)
+    return medoids[kept], np.searchsorted(kept, labels)
+
+
+def build_templates(directories, speaker_type=None, k=1, iterations=10):
+    """
+    Builds averaged per-word templates from many ``Testcase`` directories.
+
+    Samples are grouped by their word pair and word, clustered into at most ``k`` groups with
+    k-medoids over their DTW distances, and every group is averaged with DTW Barycenter Averaging.
+
+    Args:
+        directories (list): The ``Testcase`` directories to average.
+        speaker_type (str): Only use directories of this speaker type ('M', 'F' or 'C').
+        k (int): The number of templates per word.
+        iterations (int): The maximum number of DBA iterations.
+
+    Returns:
+        list: The template samples ordered by word pair and word.
+    """
+    # Imported here since recognition itself loads TemplateSet
+    from recognition import WordRecognition
+
+    groups = {}
+    for directory in directories:
+        case = Testcase(directory)
+        if speaker_type is not None and case.get_main_sample()['speaker type'] != speaker_type:
+            continue
+        for sample in case.get_cases():
+            features = WordRecognition.extract_features(sample['wav'])
+            groups.setdefault((sample['word pair'], sample['word']), []).append((sample, features))
+
+    samples = []
+    for (pair, word), members in sorted(groups.items()):
+        features = [f for _, f in members]
+        n = len(features)
+        distances = np.zeros((n, n))
+        for i in range(n):
+            for j in range(i + 1, n):
+                distances[i, j] = distances[j, i] = WordRecognition.compare_features(features[i], features[j])
+
+        medoids, labels = k_medoids(distances, k)
+        templates = []
+        for c, medoid in enumerate(medoids):
+            cluster = [features[i] for i in np.flatnonzero(labels == c)]
+            templates.append(dtw_barycenter(cluster, features[medoid], iterations))
+
+        central = members[int(np.argmin(distances.sum(axis=1)))][0]
+        samples.append({
+            'name': central['name'],
+            'student_number': 0,
+            'speaker type': speaker_type if speaker_type is not None else central['speaker type'],
+            'speaker age': 0,
+            'word pair': pair,
+            'word': word,
+            'speakers': n,
+            'templates': templates,
+            'wav': central['wav'],
+        })
+
+    return samples
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build averaged reference templates.')
+    parser.add_argument('output', help='template file to write')
+    parser.add_argument('type', choices=['M', 'F', 'C'], help='speaker type to average')
+    parser.add_argument('directories', nargs='+', help='Testcase directories')
+    parser.add_argument('-k', type=int, default=1, help='templates per word')
+    parser.add_argument('--iterations', type=int, default=10, help='DBA iterations')
+    args = parser.parse_args()
+
+    TemplateSet.write(args.output, build_templates(args.directories, args.type, args.k, args.iterations))
@@ -1,8 +1,7 @@
 import glob
 import os
 import re
-import librosa
-from pydub import AudioSegment
+import ingest
 
 
 class Testcase:
@@ -16,6 +15,9 @@ class Testcase:
         else:
             self.__read_exists_data()
 
+    def get_name(self):
+        return self.__name
+
     def get_cases(self):
         return self.__testcases
 
@@ -26,7 +28,7 @@ class Testcase:
         return self.__testcases[46]
 
     @staticmethod
-    def __extract_information(x):
+    def extract_information(x):
         # x = 'G02S1F22MP01W1R'
         ex = re.compile(r'G(\d+)S(\d)(\S)(\d+)[WM]P(\d+)W?(\d)?')
         a = re.findall(ex, x)
@@ -64,7 +66,11 @@ class Testcase:
             return False
 
     def __generate_wav(self):
-        sound_files = glob.glob(self.__name + '\\*.mp3')
+        # pydub is only needed to convert mp3 sources
+        from pydub import AudioSegment
+
+        # Sorted so word positions do not depend on the file system's listing order
+        sound_files = sorted(glob.glob(self.__name + '\\*.mp3'))
         os.mkdir(self.__name + '\\Wav')
         current_path = os.getcwd()
         os.chdir(self.__name + '\\Wav')
@@ -73,22 +79,21 @@ class Testcase:
             new_name = (old_name).split('.')[0] + '.wav'
             sound = AudioSegment.from_mp3('..\\' + old_name)
             sound.export(new_name, format='wav')
-            sample = Testcase.__extract_information(new_name)
-            t, f = librosa.load(new_name, sr=None)
-            sample['wav'] = t
+            sample = Testcase.extract_information(new_name)
+            sample['wav'] = ingest.load(new_name)
             self.__testcases.append(sample)
 
         os.chdir(current_path)
 
     def __read_exists_data(self):
-        files = glob.glob(self.__name + '\\Wav\\*.wav')
+        # Sorted so word positions do not depend on the file system's listing order
+        files = sorted(glob.glob(self.__name + '\\Wav\\*.wav'))
 
         for file in files:
             name = os.path.basename(os.path.normpath(file))
             print(name)
-            sample = self.__extract_information(name)
-            t, f = librosa.load(file, sr=None)
-            sample['wav'] = t
+            sample = self.extract_information(name)
+            sample['wav'] = ingest.load(file)
             self.__testcases.append(sample)
             print(sample)
 